@@ -1,2 +1,20 @@
+"""
+FEMhub mesh tools.
+
+Importing the package is cheap: NumPy, matplotlib, mayavi and hermes2d are
+only imported by the functions that need them, so the processes that only
+triangulate do not pay for them (and need no display backend).
+
+Example:
+
+>>> import os, subprocess, sys
+>>> import femhub
+>>> root = os.path.dirname(os.path.dirname(os.path.abspath(femhub.__file__)))
+>>> code = "import sys; sys.path.insert(0, %r); import femhub; print [m for m in ['matplotlib', 'pylab', 'numpy', 'enthought', 'hermes2d'] if m in sys.modules]" % root
+>>> subprocess.check_output([sys.executable, "-c", code])
+'[]\\n'
+
+"""
+
 from domain import Domain, Mesh
 from plot import plotsln
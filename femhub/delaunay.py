@@ -0,0 +1,891 @@
+"""
+Constrained Delaunay triangulation.
+
+The triangulation is built incrementally: the points are inserted (in a
+biased randomized order, so that the point location walk from the last
+inserted triangle is short) into a big enclosing triangle, and the Delaunay
+property is restored by edge flips after each insertion. The boundary edges are then
+recovered by flipping the edges that cross them, and finally only the
+triangles inside the domain are kept.
+
+The triangles are stored in the lists "tris" (the three vertices, counter
+clockwise) and "nbrs" (nbrs[t][i] is the triangle across the edge opposite
+to the vertex tris[t][i], or -1).
+
+The triangulation can then be refined by inserting circumcenters of bad
+triangles (Ruppert's algorithm), see refine_quality().
+"""
+
+from random import Random
+from heapq import heappush, heappop
+from math import sqrt, sin, radians, log
+
+from renumbering import hilbert_permutation
+from triangulation import TriangulationError
+
+def orient(p, q, r):
+    """
+    Returns twice the signed area of the triangle (p, q, r), positive if
+    (p, q, r) is counter clockwise.
+
+    Example:
+
+    >>> orient((0, 0), (1, 0), (0, 1))
+    1
+    >>> orient((0, 0), (0, 1), (1, 0))
+    -1
+
+    """
+    return (q[0]-p[0])*(r[1]-p[1]) - (q[1]-p[1])*(r[0]-p[0])
+
+def incircle(a, b, c, d):
+    """
+    Returns a positive number if the point "d" lies inside the circumcircle
+    of the counter clockwise triangle (a, b, c), negative if outside and
+    zero if on the circle.
+
+    Example:
+
+    >>> incircle((0, 0), (1, 0), (0, 1), (0.5, 0.5)) > 0
+    True
+    >>> incircle((0, 0), (1, 0), (0, 1), (1, 1))
+    0
+    >>> incircle((0, 0), (1, 0), (0, 1), (2, 2)) < 0
+    True
+
+    """
+    adx = a[0]-d[0]; ady = a[1]-d[1]
+    bdx = b[0]-d[0]; bdy = b[1]-d[1]
+    cdx = c[0]-d[0]; cdy = c[1]-d[1]
+    alift = adx*adx + ady*ady
+    blift = bdx*bdx + bdy*bdy
+    clift = cdx*cdx + cdy*cdy
+    return (adx*(bdy*clift - cdy*blift) - ady*(bdx*clift - cdx*blift)
+            + alift*(bdx*cdy - bdy*cdx))
+
+def _edge_key(a, b):
+    if a < b:
+        return (a, b)
+    return (b, a)
+
+class DelaunayTriangulation:
+    """
+    A (constrained) Delaunay triangulation of a set of points.
+
+    The vertices 0 ... len(pts_list)-1 are the given points (a duplicate
+    point is not inserted, "index" maps it to the first copy). The next
+    three vertices are the corners of the enclosing triangle, the vertices
+    inserted later by insert() follow.
+
+    When a constrained edge is split by an inserted point, "split_points"
+    maps the (sorted) edge to the point. If "flags" is set to a list with a
+    value for each triangle (e.g. by inside_flags()), the new triangles get
+    the value of the triangle they were split from.
+
+    Example:
+
+    >>> dt = DelaunayTriangulation([[0, 0], [1, 0], [1, 1], [0, 1], [0.5, 0.2]])
+    >>> edges = [(0, 1), (1, 2), (2, 3), (3, 0)]
+    >>> for a, b in edges:
+    ...     dt.add_constraint(a, b)
+    >>> dt.inside_triangles(edges)
+    [(2, 3, 4), (3, 0, 4), (1, 4, 0), (1, 2, 4)]
+
+    """
+
+    def __init__(self, pts_list):
+        pts = [(float(x), float(y)) for x, y in pts_list]
+        n = len(pts)
+        if n > 0:
+            min_x, min_y = max_x, max_y = pts[0]
+            for x, y in pts:
+                if x < min_x: min_x = x
+                if y < min_y: min_y = y
+                if x > max_x: max_x = x
+                if y > max_y: max_y = y
+        else:
+            min_x = min_y = max_x = max_y = 0.
+        cx = (min_x + max_x)/2.
+        cy = (min_y + max_y)/2.
+        r = max(max_x - min_x, max_y - min_y, 1e-12)*20
+        self.pts = pts + [(cx - 2*r, cy - r), (cx + 2*r, cy - r),
+                (cx, cy + 2*r)]
+        self.n_input = n
+        self.tris = []
+        self.nbrs = []
+        self.vtri = [-1]*len(self.pts)
+        self.constraints = set()
+        self.split_points = {}
+        self.flags = None
+        self._random = Random(0)
+        self._last = self._new_tri(n, n+1, n+2, -1, -1, -1)
+        self.index = range(n)
+        for i in self._insertion_order(pts):
+            self.index[i] = self._insert_vertex(i)
+
+    def _insertion_order(self, pts):
+        """
+        Returns the biased randomized insertion order of the points "pts":
+        the shuffled points are split into rounds, each twice as big as the
+        previous one, and each round is sorted along the Hilbert curve.
+
+        The random order keeps the expected number of flips per insertion
+        constant, the Hilbert order keeps the point location walks short.
+        """
+        order = range(len(pts))
+        self._random.shuffle(order)
+        bounds = []
+        m = len(order)
+        while m > 64:
+            bounds.append(m)
+            m //= 2
+        bounds.append(m)
+        bounds.reverse()
+        result = []
+        start = 0
+        for end in bounds:
+            chunk = order[start:end]
+            result.extend([chunk[k] for k in
+                hilbert_permutation([pts[i] for i in chunk])])
+            start = end
+        return result
+
+    def _new_tri(self, a, b, c, na, nb, nc):
+        t = len(self.tris)
+        self.tris.append([a, b, c])
+        self.nbrs.append([na, nb, nc])
+        self.vtri[a] = self.vtri[b] = self.vtri[c] = t
+        return t
+
+    def _set_tri(self, t, a, b, c, na, nb, nc):
+        self.tris[t] = [a, b, c]
+        self.nbrs[t] = [na, nb, nc]
+        self.vtri[a] = self.vtri[b] = self.vtri[c] = t
+
+    def _replace_nbr(self, t, old, new):
+        if t != -1:
+            nbrs = self.nbrs[t]
+            nbrs[nbrs.index(old)] = new
+
+    def locate(self, p, t=None):
+        """
+        Finds the triangle containing the point "p" by walking from the
+        triangle "t" (the last created triangle by default).
+
+        Returns (t, kind, i), where kind is "in" (p is inside of t), "edge"
+        (p is on the edge opposite to the vertex i of t) or "vertex" (p is
+        the vertex i of t).
+        """
+        pts = self.pts
+        tris = self.tris
+        if t is None:
+            t = self._last
+        rnd = self._random.randrange
+        while True:
+            V = tris[t]
+            s = rnd(3)
+            for k in range(3):
+                i = (s + k) % 3
+                if orient(pts[V[(i+1) % 3]], pts[V[(i+2) % 3]], p) < 0:
+                    t = self.nbrs[t][i]
+                    if t == -1:
+                        raise TriangulationError("Point %s is outside of the triangulation." % (p,))
+                    break
+            else:
+                break
+        V = tris[t]
+        zeros = [i for i in range(3)
+                if orient(pts[V[(i+1) % 3]], pts[V[(i+2) % 3]], p) == 0]
+        if len(zeros) == 0:
+            return t, "in", -1
+        if len(zeros) == 1:
+            return t, "edge", zeros[0]
+        i = 3 - zeros[0] - zeros[1]
+        return t, "vertex", i
+
+    def insert(self, x, y, t=None):
+        """
+        Inserts the point (x, y) and returns its vertex index.
+
+        If the point lies on a constrained edge, the constraint is split
+        into two. The search for the point starts at the triangle "t".
+        """
+        self.pts.append((float(x), float(y)))
+        self.vtri.append(-1)
+        p = self._insert_vertex(len(self.pts) - 1, t)
+        if p != len(self.pts) - 1:
+            # the point is already there
+            self.pts.pop()
+            self.vtri.pop()
+        return p
+
+    def split_edge(self, a, b, s=0.5):
+        """
+        Inserts the point a + s*(b - a) on the edge (a, b) (the midpoint by
+        default) and returns its vertex index.
+
+        Unlike insert(), the point is put on the edge even if it is not
+        exactly on the line (a, b) in floating point arithmetic. If the edge
+        is constrained, the constraint is split into two.
+        """
+        res = self.find_edge(a, b) or self.find_edge(b, a)
+        if res is None:
+            raise TriangulationError("Edge (%d, %d) is not in the triangulation." % (a, b))
+        t, i = res
+        A = self.pts[a]
+        B = self.pts[b]
+        self.pts.append((A[0] + s*(B[0] - A[0]), A[1] + s*(B[1] - A[1])))
+        self.vtri.append(-1)
+        p = len(self.pts) - 1
+        new = self._split_edge(t, i, p)
+        self._legalize([(s, p) for s in new])
+        self._last = self.vtri[p]
+        return p
+
+    def _insert_vertex(self, p, t=None):
+        t, kind, i = self.locate(self.pts[p], t)
+        if kind == "vertex":
+            return self.tris[t][i]
+        if kind == "in":
+            new = self._split_triangle(t, p)
+        else:
+            new = self._split_edge(t, i, p)
+        self._legalize([(s, p) for s in new])
+        self._last = self.vtri[p]
+        return p
+
+    def _split_triangle(self, t, p):
+        a, b, c = self.tris[t]
+        na, nb, nc = self.nbrs[t]
+        t1 = len(self.tris)
+        t2 = t1 + 1
+        self._set_tri(t, p, b, c, na, t1, t2)
+        self._new_tri(p, c, a, nb, t2, t)
+        self._new_tri(p, a, b, nc, t, t1)
+        if self.flags is not None:
+            self.flags.extend([self.flags[t]]*2)
+        self._replace_nbr(nb, t, t1)
+        self._replace_nbr(nc, t, t2)
+        self.vtri[p] = t
+        return [t, t1, t2]
+
+    def _split_edge(self, t, i, p):
+        V = self.tris[t]
+        N = self.nbrs[t]
+        a, b, c = V[i], V[(i+1) % 3], V[(i+2) % 3]
+        nb, nc = N[(i+1) % 3], N[(i+2) % 3]
+        u = N[i]
+        key = _edge_key(b, c)
+        if key in self.constraints:
+            self.constraints.remove(key)
+            self.constraints.add(_edge_key(b, p))
+            self.constraints.add(_edge_key(p, c))
+            self.split_points[key] = p
+        t1 = len(self.tris)
+        if u == -1:
+            self._set_tri(t, a, b, p, -1, t1, nc)
+            self._new_tri(a, p, c, -1, nb, t)
+            self._replace_nbr(nb, t, t1)
+            if self.flags is not None:
+                self.flags.append(self.flags[t])
+            return [t, t1]
+        U = self.tris[u]
+        j = [k for k in range(3) if U[k] != b and U[k] != c][0]
+        d = U[j]
+        ub = self.nbrs[u][[k for k in range(3) if U[k] == b][0]]
+        uc = self.nbrs[u][[k for k in range(3) if U[k] == c][0]]
+        u1 = t1 + 1
+        self._set_tri(t, a, b, p, u1, t1, nc)
+        self._new_tri(a, p, c, u, nb, t)
+        self._set_tri(u, d, c, p, t1, u1, ub)
+        self._new_tri(d, p, b, t, uc, u)
+        self._replace_nbr(nb, t, t1)
+        self._replace_nbr(uc, u, u1)
+        if self.flags is not None:
+            self.flags.append(self.flags[t])
+            self.flags.append(self.flags[u])
+        return [t, t1, u, u1]
+
+    def _flip(self, t, i):
+        """
+        Flips the edge opposite to the vertex i of the triangle t.
+
+        If t = (p, a, b) and the triangle across (a, b) is (d, b, a), the
+        two triangles become (p, a, d) and (p, d, b). Returns them.
+        """
+        V = self.tris[t]
+        N = self.nbrs[t]
+        p, a, b = V[i], V[(i+1) % 3], V[(i+2) % 3]
+        t_opp_a, t_opp_b = N[(i+1) % 3], N[(i+2) % 3]
+        u = N[i]
+        U = self.tris[u]
+        j = [k for k in range(3) if U[k] != a and U[k] != b][0]
+        d = U[j]
+        u_opp_b = self.nbrs[u][(j+1) % 3]
+        u_opp_a = self.nbrs[u][(j+2) % 3]
+        self._set_tri(t, p, a, d, u_opp_b, u, t_opp_b)
+        self._set_tri(u, p, d, b, u_opp_a, t_opp_a, t)
+        self._replace_nbr(u_opp_b, u, t)
+        self._replace_nbr(t_opp_a, t, u)
+        return t, u
+
+    def _legalize(self, stack):
+        """
+        Restores the Delaunay property: "stack" is a list of (t, p), the
+        edge of the triangle t opposite to its vertex p is flipped if it is
+        not locally Delaunay (constrained edges are never flipped).
+        """
+        pts = self.pts
+        while stack:
+            t, p = stack.pop()
+            V = self.tris[t]
+            if p not in V:
+                continue
+            i = V.index(p)
+            a, b = V[(i+1) % 3], V[(i+2) % 3]
+            u = self.nbrs[t][i]
+            if u == -1 or _edge_key(a, b) in self.constraints:
+                continue
+            U = self.tris[u]
+            d = [v for v in U if v != a and v != b][0]
+            P = pts[p]; D = pts[d]
+            if incircle(P, pts[a], pts[b], D) > 0 and \
+                    orient(P, pts[a], D) > 0 and orient(P, D, pts[b]) > 0:
+                t, u = self._flip(t, i)
+                stack.append((t, p))
+                stack.append((u, p))
+
+    def star(self, v):
+        """
+        Returns the list of triangles around the vertex "v".
+        """
+        t0 = self.vtri[v]
+        if t0 == -1:
+            return []
+        result = [t0]
+        t = t0
+        while True:
+            V = self.tris[t]
+            k = V.index(v)
+            t = self.nbrs[t][(k+2) % 3]
+            if t == t0:
+                return result
+            if t == -1:
+                break
+            result.append(t)
+        t = t0
+        while True:
+            V = self.tris[t]
+            k = V.index(v)
+            t = self.nbrs[t][(k+1) % 3]
+            if t == -1:
+                return result
+            result.append(t)
+
+    def find_edge(self, a, b):
+        """
+        Returns (t, i), where the triangle t contains the directed edge
+        (a, b) and i is the index of its third vertex, or None if there is
+        no such triangle.
+        """
+        for t in self.star(a):
+            V = self.tris[t]
+            k = V.index(a)
+            if V[(k+1) % 3] == b:
+                return t, (k+2) % 3
+        return None
+
+    def add_constraint(self, a, b):
+        """
+        Forces the edge (a, b) into the triangulation.
+
+        The edges crossing (a, b) are flipped until none is left (Sloan's
+        algorithm), then the Delaunay property is restored around the new
+        edges.
+        """
+        if a == b:
+            return
+        pts = self.pts
+        A = pts[a]
+        B = pts[b]
+        crossing = []
+        if self.find_edge(a, b) is None and self.find_edge(b, a) is None:
+            # find the triangle at "a" whose opposite edge crosses (a, b)
+            for t in self.star(a):
+                V = self.tris[t]
+                k = V.index(a)
+                p, q = V[(k+1) % 3], V[(k+2) % 3]
+                op = orient(A, B, pts[p])
+                oq = orient(A, B, pts[q])
+                if op == 0 and self._between(a, b, p) or \
+                        oq == 0 and self._between(a, b, q):
+                    raise TriangulationError("Boundary edge (%d, %d) passes through a node." % (a, b))
+                if op < 0 and oq > 0:
+                    break
+            else:
+                raise TriangulationError("Cannot recover boundary edge (%d, %d)." % (a, b))
+            # walk along (a, b) and collect the crossing edges (p is on
+            # the right, q on the left of (a, b))
+            while True:
+                crossing.append((p, q))
+                res = self.find_edge(q, p)
+                t, k = res
+                r = self.tris[t][k]
+                if r == b:
+                    break
+                o = orient(A, B, pts[r])
+                if o == 0:
+                    raise TriangulationError("Boundary edge (%d, %d) passes through a node." % (a, b))
+                if o < 0:
+                    p = r
+                else:
+                    q = r
+        new_edges = []
+        while crossing:
+            p, q = crossing.pop(0)
+            t, k = self.find_edge(p, q)
+            w1 = self.tris[t][k]
+            u, l = self.find_edge(q, p)
+            w2 = self.tris[u][l]
+            P = pts[p]; Q = pts[q]; W1 = pts[w1]; W2 = pts[w2]
+            o1 = orient(W1, W2, P)
+            o2 = orient(W1, W2, Q)
+            if not ((o1 > 0 and o2 < 0) or (o1 < 0 and o2 > 0)):
+                # the quadrilateral is not convex, try later
+                crossing.append((p, q))
+                continue
+            self._flip(t, k)
+            if w1 in (a, b) or w2 in (a, b):
+                new_edges.append((w1, w2))
+                continue
+            s1 = orient(A, B, W1)
+            s2 = orient(A, B, W2)
+            if (s1 > 0 and s2 < 0) or (s1 < 0 and s2 > 0):
+                crossing.append((w1, w2))
+            else:
+                new_edges.append((w1, w2))
+        self.constraints.add(_edge_key(a, b))
+        stack = []
+        for p, q in new_edges:
+            if _edge_key(p, q) == _edge_key(a, b):
+                continue
+            res = self.find_edge(p, q)
+            if res is not None:
+                t, k = res
+                stack.append((t, self.tris[t][k]))
+        self._legalize(stack)
+
+    def _between(self, a, b, p):
+        A = self.pts[a]; B = self.pts[b]; P = self.pts[p]
+        return (min(A[0], B[0]) <= P[0] <= max(A[0], B[0]) and
+                min(A[1], B[1]) <= P[1] <= max(A[1], B[1]))
+
+    def inside_triangles(self, bdy_edges):
+        """
+        Returns the triangles inside the domain bounded by the (oriented,
+        already constrained) edges "bdy_edges" as a list of tuples.
+
+        The triangles to the left of the boundary edges are inside, and so
+        is every triangle reachable from them without crossing a
+        constrained edge.
+        """
+        inside = self.inside_flags(bdy_edges)
+        return [tuple(self.tris[t]) for t in range(len(self.tris))
+                if inside[t]]
+
+    def inside_flags(self, bdy_edges):
+        """
+        Returns a list of booleans, True for the triangles inside the
+        domain bounded by "bdy_edges" (see inside_triangles()).
+        """
+        inside = [False]*len(self.tris)
+        stack = []
+        for a, b in bdy_edges:
+            res = self.find_edge(a, b)
+            if res is None:
+                raise TriangulationError("Boundary edge (%d, %d) is not in the triangulation." % (a, b))
+            t = res[0]
+            if not inside[t]:
+                inside[t] = True
+                stack.append(t)
+        while stack:
+            t = stack.pop()
+            V = self.tris[t]
+            for i in range(3):
+                s = self.nbrs[t][i]
+                if s == -1 or inside[s]:
+                    continue
+                if _edge_key(V[(i+1) % 3], V[(i+2) % 3]) in self.constraints:
+                    continue
+                inside[s] = True
+                stack.append(s)
+        return inside
+
+def triangulate_delaunay(pts_list, bdy_edges):
+    """
+    Create a constrained Delaunay triangulation of the domain given by the
+    points "pts_list" and the oriented boundary edges "bdy_edges" (the outer
+    boundary counter clockwise, the holes clockwise, as returned by
+    orient_loops()). Triangles inside the holes are dropped.
+
+    Returns the list of elements (counter clockwise triples of point
+    indices).
+
+    Example:
+
+    >>> triangulate_delaunay([(0,0),(1,0),(1,1),(0,1),(0.5,0.5)],[(0,1),(1,2),(2,3),(3,0)])
+    [(2, 3, 4), (3, 0, 4), (1, 2, 4), (1, 4, 0)]
+
+    """
+    dt = DelaunayTriangulation(pts_list)
+    edges = [(dt.index[a], dt.index[b]) for a, b in bdy_edges]
+    for a, b in edges:
+        dt.add_constraint(a, b)
+    return dt.inside_triangles(edges)
+
+def circumcenter(a, b, c):
+    """
+    Returns the center of the circle through the points "a", "b", "c".
+
+    Example:
+
+    >>> circumcenter((0, 0), (2, 0), (0, 2))
+    (1.0, 1.0)
+
+    """
+    bx = float(b[0] - a[0]); by = float(b[1] - a[1])
+    cx = float(c[0] - a[0]); cy = float(c[1] - a[1])
+    d = 2*(bx*cy - by*cx)
+    b2 = bx*bx + by*by
+    c2 = cx*cx + cy*cy
+    return a[0] + (cy*b2 - by*c2)/d, a[1] + (bx*c2 - cx*b2)/d
+
+def _encroaches(p, a, b):
+    """
+    Returns True if the point "p" lies inside the diametral circle of the
+    segment (a, b).
+    """
+    return (p[0] - a[0])*(p[0] - b[0]) + (p[1] - a[1])*(p[1] - b[1]) < 0
+
+class _Refinement:
+    """
+    The state of refine_quality(): the triangulation, the segments with
+    their markers and the queues of encroached segments and bad triangles.
+    """
+
+    def __init__(self, dt, segments, min_angle, max_area, max_points):
+        self.dt = dt
+        # sorted segment -> (a, b, marker), oriented as the boundary
+        self.segments = {}
+        # vertex -> the set of the original segments (as sorted keys) it
+        # lies on, used to detect small input angles
+        self.on_segment = {}
+        for a, b, marker in segments:
+            key = _edge_key(a, b)
+            self.segments[key] = (a, b, marker)
+            self.on_segment.setdefault(a, set()).add(key)
+            self.on_segment.setdefault(b, set()).add(key)
+        self.origin = dict([(key, key) for key in self.segments])
+        # a triangle is bad if its circumradius to shortest edge ratio is
+        # larger than this
+        self.max_ratio = 1/(2*sin(radians(min_angle)))
+        self.max_area = max_area
+        self.max_points = max_points
+        self.n_points = 0
+        self.heap = []
+
+    def is_bad(self, t):
+        dt = self.dt
+        a, b, c = [dt.pts[v] for v in dt.tris[t]]
+        area = orient(a, b, c)/2.
+        if area <= 0:
+            return None
+        la = (b[0]-c[0])**2 + (b[1]-c[1])**2
+        lb = (c[0]-a[0])**2 + (c[1]-a[1])**2
+        lc = (a[0]-b[0])**2 + (a[1]-b[1])**2
+        # R = la*lb*lc/(4*area), so (R/shortest)**2 is:
+        ratio2 = la*lb*lc/(16*area*area*min(la, lb, lc))
+        if ratio2 > self.max_ratio**2 and \
+                not self.small_input_angle(t, la, lb, lc):
+            return -ratio2
+        if self.max_area is not None and area > self.max_area:
+            return -area
+        return None
+
+    def small_input_angle(self, t, la, lb, lc):
+        """
+        Returns True if the shortest edge of the triangle t joins two points
+        on two segments that meet at an angle below 60 degrees (splitting
+        such triangles would never end).
+        """
+        V = self.dt.tris[t]
+        lengths = [la, lb, lc]
+        i = lengths.index(min(lengths))
+        u, v = V[(i+1) % 3], V[(i+2) % 3]
+        su = self.on_segment.get(u)
+        sv = self.on_segment.get(v)
+        if not su or not sv:
+            return False
+        pts = self.dt.pts
+        for s1 in su:
+            for s2 in sv:
+                if s1 == s2:
+                    continue
+                common = set(s1) & set(s2)
+                if not common:
+                    continue
+                w = common.pop()
+                p = s1[0] if s1[1] == w else s1[1]
+                q = s2[0] if s2[1] == w else s2[1]
+                W = pts[w]; P = pts[p]; Q = pts[q]
+                ux = P[0] - W[0]; uy = P[1] - W[1]
+                vx = Q[0] - W[0]; vy = Q[1] - W[1]
+                cos = (ux*vx + uy*vy)/sqrt((ux*ux + uy*uy)*(vx*vx + vy*vy))
+                if cos > 0.5:
+                    return True
+        return False
+
+    def push(self, t):
+        if self.dt.flags[t]:
+            priority = self.is_bad(t)
+            if priority is not None:
+                heappush(self.heap, (priority, t, tuple(self.dt.tris[t])))
+
+    def push_star(self, v):
+        for t in self.dt.star(v):
+            self.push(t)
+
+    def encroached_at(self, v):
+        """
+        Returns the segments that are opposite to the vertex "v" in its star
+        and encroached by it.
+        """
+        dt = self.dt
+        result = []
+        P = dt.pts[v]
+        for t in dt.star(v):
+            V = dt.tris[t]
+            k = V.index(v)
+            a, b = V[(k+1) % 3], V[(k+2) % 3]
+            key = _edge_key(a, b)
+            if key in self.segments and _encroaches(P, dt.pts[a], dt.pts[b]):
+                result.append(key)
+        return result
+
+    def split_segment(self, key):
+        """
+        Splits the segment "key", then splits the segments encroached by the
+        new point. Returns False if the point limit was reached.
+
+        A segment with exactly one end at an input vertex is split at a
+        power of two distance from that vertex (concentric shells), so that
+        the segments meeting at a small angle are split at the same
+        distances and stop encroaching upon each other. Other segments are
+        split in the middle.
+        """
+        dt = self.dt
+        stack = [key]
+        while stack:
+            key = stack.pop()
+            if key not in self.segments:
+                continue
+            if self.max_points is not None and \
+                    self.n_points >= self.max_points:
+                return False
+            a, b, marker = self.segments[key]
+            p = dt.split_edge(a, b, self._split_ratio(a, b))
+            self.n_points += 1
+            self._update_segments()
+            self.push_star(p)
+            stack.extend(self.encroached_at(p))
+            for q in (a, b):
+                stack.extend(self.encroached_at(q))
+        return True
+
+    def _split_ratio(self, a, b):
+        n = self.dt.n_input
+        if (a < n) == (b < n):
+            return 0.5
+        A = self.dt.pts[a]; B = self.dt.pts[b]
+        length = sqrt((B[0] - A[0])**2 + (B[1] - A[1])**2)
+        d = 2.**round(log(length/2., 2))
+        if a < n:
+            return d/length
+        return 1 - d/length
+
+    def _update_segments(self):
+        """
+        Replaces the segments split by the triangulation by their halves.
+        """
+        dt = self.dt
+        for key, p in dt.split_points.items():
+            a, b, marker = self.segments.pop(key)
+            origin = self.origin.pop(key)
+            for half in [(a, p, marker), (p, b, marker)]:
+                k = _edge_key(half[0], half[1])
+                self.segments[k] = half
+                self.origin[k] = origin
+            self.on_segment[p] = set([origin])
+        dt.split_points.clear()
+
+    def _cavity_segments(self, p, t):
+        """
+        Returns the segments on the boundary of the cavity of the point "p"
+        (the triangles whose circumcircles contain "p", starting from the
+        triangle t that contains it) that are encroached by "p".
+        """
+        dt = self.dt
+        pts = dt.pts
+        seen = set([t])
+        stack = [t]
+        result = []
+        while stack:
+            t = stack.pop()
+            V = dt.tris[t]
+            for i in range(3):
+                a, b = V[(i+1) % 3], V[(i+2) % 3]
+                key = _edge_key(a, b)
+                if key in self.segments:
+                    if _encroaches(p, pts[a], pts[b]):
+                        result.append(key)
+                    continue
+                u = dt.nbrs[t][i]
+                if u == -1 or u in seen:
+                    continue
+                U = dt.tris[u]
+                if incircle(pts[U[0]], pts[U[1]], pts[U[2]], p) > 0:
+                    seen.add(u)
+                    stack.append(u)
+        return result
+
+    def _walk(self, t, p):
+        """
+        Walks from the triangle t to the point "p" without crossing the
+        segments. Returns (t, None) if t contains "p", or (t, key) if the
+        walk is blocked by the segment "key".
+        """
+        dt = self.dt
+        pts = dt.pts
+        while True:
+            V = dt.tris[t]
+            for i in range(3):
+                a, b = V[(i+1) % 3], V[(i+2) % 3]
+                if orient(pts[a], pts[b], p) < 0:
+                    key = _edge_key(a, b)
+                    if key in self.segments:
+                        return t, key
+                    t = dt.nbrs[t][i]
+                    break
+            else:
+                return t, None
+
+    def run(self):
+        dt = self.dt
+        for key in list(self.segments):
+            a, b, marker = self.segments.get(key, (None, None, None))
+            if a is None:
+                continue
+            res = dt.find_edge(a, b) or dt.find_edge(b, a)
+            t, k = res
+            others = [dt.tris[t][k]]
+            u = dt.nbrs[t][k]
+            if u != -1:
+                others.append([v for v in dt.tris[u] if v != a and v != b][0])
+            for v in others:
+                if v < len(dt.pts) and _encroaches(dt.pts[v], dt.pts[a],
+                        dt.pts[b]):
+                    if not self.split_segment(key):
+                        return
+                    break
+        for t in range(len(dt.tris)):
+            self.push(t)
+        while self.heap:
+            priority, t, tri = heappop(self.heap)
+            if tuple(dt.tris[t]) != tri or self.is_bad(t) is None:
+                continue
+            if self.max_points is not None and \
+                    self.n_points >= self.max_points:
+                return
+            pts = dt.pts
+            c = circumcenter(pts[tri[0]], pts[tri[1]], pts[tri[2]])
+            s, key = self._walk(t, c)
+            if key is not None:
+                encroached = [key]
+            else:
+                encroached = self._cavity_segments(c, s)
+            if encroached:
+                for key in encroached:
+                    if not self.split_segment(key):
+                        return
+                self.push(t)
+                continue
+            n = len(dt.pts)
+            p = dt.insert(c[0], c[1], s)
+            if p < n:
+                # the circumcenter is (numerically) an existing vertex
+                continue
+            self.n_points += 1
+            self._update_segments()
+            self.push_star(p)
+
+def refine_quality(pts_list, boundaries, min_angle=20., max_area=None,
+        max_points=None):
+    """
+    Creates a quality mesh of the domain given by the points "pts_list" and
+    the boundary edges "boundaries" (records [a, b, marker], oriented as
+    the boundary edges in triangulate_delaunay()).
+
+    The constrained Delaunay triangulation of the points is refined by
+    Ruppert's algorithm: the circumcenters of the triangles with an angle
+    smaller than "min_angle" (degrees) or with the area larger than
+    "max_area" are inserted, the worst triangle first. If a circumcenter
+    would encroach upon a boundary segment (lie inside its diametral
+    circle), the segment is split in the middle instead. The algorithm is
+    guaranteed to end for min_angle up to about 20 degrees. Triangles at
+    input angles smaller than 60 degrees are accepted as they are. At most
+    "max_points" points are inserted (if given).
+
+    Returns (nodes, elements, boundaries): the points "pts_list" followed
+    by the new points, the elements and the boundary records, where each
+    input record is replaced by the chain of its parts (with the same
+    marker).
+
+    Example:
+
+    >>> nodes, elems, bdy = refine_quality([(0,0),(4,0),(4,1),(0,1)], [[0,1,1],[1,2,2],[2,3,3],[3,0,4]], max_area=0.5)
+    >>> len(nodes), len(elems)
+    (10, 8)
+    >>> bdy
+    [[0, 6, 1], [6, 5, 1], [5, 9, 1], [9, 1, 1], [1, 2, 2], [2, 8, 3], [8, 4, 3], [4, 7, 3], [7, 3, 3], [3, 0, 4]]
+
+    """
+    dt = DelaunayTriangulation(pts_list)
+    n = dt.n_input
+    index = dt.index
+    segments = [(index[b[0]], index[b[1]], b[2]) for b in boundaries]
+    for a, b, marker in segments:
+        dt.add_constraint(a, b)
+    dt.split_points.clear()
+    dt.flags = dt.inside_flags([(a, b) for a, b, marker in segments])
+    r = _Refinement(dt, segments, min_angle, max_area, max_points)
+    r.run()
+    def vertex(v):
+        if v < n:
+            return v
+        return v - 3
+    nodes = list(pts_list) + [list(p) for p in dt.pts[n+3:]]
+    elems = [tuple([vertex(v) for v in dt.tris[t]])
+            for t in range(len(dt.tris)) if dt.flags[t]]
+    # the parts of each boundary record, in order
+    parts = {}
+    for key, (a, b, marker) in r.segments.items():
+        parts[a] = b
+    bdy = []
+    for a, b, marker in segments:
+        while True:
+            c = parts[a]
+            bdy.append([vertex(a), vertex(c), marker])
+            if c == b:
+                break
+            a = c
+    return nodes, elems, bdy
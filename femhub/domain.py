@@ -335,13 +335,42 @@ class Domain:
         from triangulation import polygon_area
         return polygon_area(self._nodes, self._edges)
 
-    def triangulate(self, debug=False):
+    def contains(self, points):
+        """
+        Returns a boolean array, True for the points (an array of the shape
+        (N, 2)) lying inside the domain.
+
+        All boundary loops (including the holes) are tested at once, see
+        location.points_in_loops(). The points on the boundary are outside,
+        as in triangulation.lies_inside().
+
+        Example:
+
+        >>> import femhub
+        >>> d = femhub.Domain([[0,0],[0,1],[1,1],[1,0],[0.25,0.25],[0.25,0.75],[0.75,0.75],[0.75,0.25]],[[0,1],[1,2],[2,3],[3,0],[4,5],[5,6],[6,7],[7,4]])
+        >>> d.contains([[0.5, 0.5], [0.1, 0.5], [0, 0.5], [0.5, 1.5]]).tolist()
+        [False, True, False, False]
+
+        """
+        from location import points_in_loops
+        return points_in_loops(points, self._nodes, self._edges)
+
+    def triangulate(self, debug=False, method="af", size=None):
         """
         Triangulates the domain.
 
         Returns an instance of the Mesh() class that contains the triangular
         mesh.
 
+        The "method" selects the triangulation algorithm, see
+        triangulation.triangulate() for the list of methods.
+
+        If the target element "size" is given (a number, a function
+        h(x, y) or a spatial.BackgroundGrid), new nodes are created inside
+        the domain, so that the elements have about this size. The boundary
+        edges are split to this size first (see
+        triangulation.split_boundary()).
+
         Example:
 
         >>> d = Domain([[0, 1], [1, 1], [1, 0], [0, 0]], [(0, 3), (3, 2), (2, 1), (1, 0)])
@@ -354,19 +383,41 @@ class Domain:
         [(1, 0, 2), (2, 0, 3)]
         >>> m.boundaries
         [[0, 3, 1], [3, 2, 1], [2, 1, 1], [1, 0, 1]]
+        >>> m = d.triangulate(size=0.1)
+        >>> len(m.boundaries), m.quality()["min_angle"].min() > 30
+        (40, True)
 
         """
-        from triangulation import triangulate_af
+        from triangulation import triangulate, split_boundary
         if debug:
             print "Triangulating..."
             print "List of points:", self._nodes
             print "List of boundary edges:", self._edges
-        elems = triangulate_af(self._nodes, self._edges)
-        boundaries = [list(b)+[1] for b in self._edges]
+        nodes = self._nodes
+        edges = self._edges
+        if size is not None:
+            # the new nodes must not be added to the domain
+            nodes = list(nodes)
+            edges, origin = split_boundary(nodes, edges, size)
+        elems = triangulate(nodes, edges, method=method, size=size)
+        boundaries = [list(b)+[1] for b in edges]
         if debug:
             print "List of elements:", elems
             print "List of boundaries:", boundaries
-        return Mesh(self._nodes, elems, boundaries)
+        return Mesh(nodes, elems, boundaries)
+
+def _as_array(a, dtype, width):
+    """
+    Converts the list of rows "a" to a 2D array of the given dtype (an empty
+    list gives an array of the shape (0, width)).
+    """
+    from numpy import asarray, empty
+    if len(a) == 0:
+        return empty((0, width), dtype=dtype)
+    a = asarray(a, dtype=dtype)
+    if a.ndim != 2:
+        raise ValueError("All rows must have the same length.")
+    return a
 
 class Mesh:
     """
@@ -390,6 +441,9 @@ class Mesh:
     [[3, 2, 1], [2, 1, 2], [1, 0, 3], [0, 3, 4]]
     >>> m.curves
     []
+
+    The nodes, elements and boundaries are stored as lists by default. Large
+    meshes can be stored in NumPy arrays instead, see use_arrays().
     """
 
     def __init__(self, nodes=[], elements=[], boundaries=[], curves=[]):
@@ -397,6 +451,243 @@ class Mesh:
         self._elements = elements
         self._boundaries = boundaries
         self._curves = curves
+        self._storage = "list"
+        self._version = 0
+        self._cache_version = 0
+        self._geometry = None
+        self._node_grid = None
+        self._node_grid_key = None
+        self._node_grid_count = 0
+        self._bdy_index = None
+        self._bdy_key = None
+        self._bdy_nodes = None
+        self._bdy_removed = set()
+        self._bisection = None
+        self._bisection_key = None
+        self._topology = None
+        self._locator = None
+        self._history = {}
+
+    @classmethod
+    def from_arrays(cls, nodes, elements, boundaries=[], curves=[]):
+        """
+        Constructs an array-backed Mesh() (see use_arrays()).
+
+        Example:
+
+        >>> from numpy import array
+        >>> m = Mesh.from_arrays(array([[0., 0.], [1., 0.], [0., 1.]]), array([[0, 1, 2]]))
+        >>> m.elements
+        array([[0, 1, 2]], dtype=int32)
+
+        """
+        m = cls(nodes, elements, boundaries, curves)
+        m.use_arrays()
+        return m
+
+    def changed(self):
+        """
+        Discards the data cached for the mesh (see element_geometry(),
+        topology(), locate() and look_up_node()).
+
+        Call it after modifying the nodes or elements in place (e.g.
+        through the "nodes" and "elements" properties), the cached data are
+        not checked against them. The methods of Mesh() call it themselves.
+        """
+        self._version += 1
+        self._geometry = None
+        self._node_grid = None
+        self._bdy_index = None
+        self._bisection = None
+        self._topology = None
+        self._locator = None
+
+    def element_geometry(self):
+        """
+        Returns the geometry of all elements (see
+        geometry.element_geometry()).
+
+        The result is cached until the mesh changes (see changed()).
+
+        Example:
+
+        >>> m = Mesh([[0.0,1.0],[1.0,1.0],[1.0,0.0],[0.0,0.0],],[[1,0,2],[2,0,3],],[[3,2,1],[2,1,2],[1,0,3],[0,3,4],],[])
+        >>> m.element_geometry()["areas"].tolist()
+        [0.5, 0.5]
+        >>> m.nodes[3] = [0.5, 0.0]
+        >>> m.changed()
+        >>> m.element_geometry()["areas"].tolist()
+        [0.5, 0.25]
+
+        """
+        self._check_version()
+        if self._geometry is None:
+            from geometry import element_geometry
+            self._geometry = element_geometry(self.node_array,
+                    self.element_array)
+        return self._geometry
+
+    def _check_version(self):
+        """
+        Discards the cached element_geometry(), topology() and locate() data
+        if the mesh changed since they were computed.
+
+        The version of the mesh is increased by changed() and by the methods
+        that only append to the nodes or elements (refine_element(),
+        bisect_elements(), look_up_node()), so the check takes constant
+        time.
+        """
+        if self._cache_version != self._version:
+            self._geometry = None
+            self._topology = None
+            self._locator = None
+            self._cache_version = self._version
+
+    def topology(self):
+        """
+        Returns the adjacency of the elements (see topology.Topology): the
+        edges, the elements around each edge and node and the neighbours of
+        each element.
+
+        The result is built on the first call and cached until the mesh
+        changes (see changed()).
+
+        Example:
+
+        >>> m = Mesh([[0.0,1.0],[1.0,1.0],[1.0,0.0],[0.0,0.0],],[[1,0,2],[2,0,3],],[[3,2,1],[2,1,2],[1,0,3],[0,3,4],],[])
+        >>> m.topology().neighbours.tolist()
+        [[-1, 1, -1], [0, -1, -1]]
+        >>> m.topology().elements_of_node(0).tolist()
+        [0, 1]
+
+        """
+        self._check_version()
+        if self._topology is None:
+            from topology import Topology
+            self._topology = Topology(len(self._nodes), self.element_array)
+        return self._topology
+
+    def locate(self, points):
+        """
+        Finds the elements containing the points (an array of the shape
+        (N, 2)).
+
+        Returns the tuple (elements, bary) of arrays: the index of the
+        element containing each point (-1 for the points outside of the
+        mesh) and the barycentric coordinates of the point in it (of the
+        shape (N, 3), NaN for the points outside). Only triangular meshes
+        are supported.
+
+        The search structure (see location.PointLocator) is built on the
+        first call and cached until the mesh changes (see changed()).
+
+        Example:
+
+        >>> m = Mesh([[0.0,1.0],[1.0,1.0],[1.0,0.0],[0.0,0.0],],[[1,0,2],[2,0,3],],[[3,2,1],[2,1,2],[1,0,3],[0,3,4],],[])
+        >>> elements, bary = m.locate([[0.75, 0.5], [0.25, 0.5], [0.5, 2]])
+        >>> elements.tolist()
+        [0, 1, -1]
+        >>> bary[0].tolist()
+        [0.25, 0.25, 0.5]
+
+        """
+        self._check_version()
+        if self._locator is None:
+            from location import PointLocator
+            self._locator = PointLocator(self.node_array, self.element_array,
+                    self.topology())
+        return self._locator.locate(points)
+
+    @property
+    def storage(self):
+        """
+        Returns "list" or "array", depending on how the mesh is stored.
+        """
+        return self._storage
+
+    def use_arrays(self):
+        """
+        Switches the mesh to the array storage.
+
+        The nodes are stored in a float64 array of the shape (N, 2), the
+        elements in an int32 array of the shape (M, 3) (or (M, 4) for quads)
+        and the boundaries in an int32 array of the shape (B, 3) (two nodes
+        and the marker). The "nodes", "elements" and "boundaries" properties
+        then return these arrays (no copy is made).
+
+        Methods that add nodes or elements one by one (look_up_node(),
+        refine_element()) switch the mesh back to lists.
+
+        Example:
+
+        >>> m = Mesh([[0.0,1.0],[1.0,1.0],[1.0,0.0],[0.0,0.0],],[[1,0,2],[2,0,3],],[[3,2,1],[2,1,2],[1,0,3],[0,3,4],],[])
+        >>> m.use_arrays()
+        >>> m.nodes.shape, m.nodes.dtype
+        ((4, 2), dtype('float64'))
+        >>> m.elements
+        array([[1, 0, 2],
+               [2, 0, 3]], dtype=int32)
+        >>> m.use_lists()
+        >>> m.elements
+        [(1, 0, 2), (2, 0, 3)]
+
+        """
+        if self._storage == "array":
+            return
+        self._nodes = _as_array(self._nodes, "float64", 2)
+        self._elements = _as_array(self._elements, "int32", 3)
+        self._boundaries = _as_array(self._boundaries, "int32", 3)
+        self._storage = "array"
+
+    def use_lists(self):
+        """
+        Switches the mesh to the list storage (see use_arrays()).
+
+        The nodes become lists [x, y], the elements tuples and the
+        boundaries lists [a, b, marker].
+        """
+        if self._storage == "list":
+            return
+        self._nodes = self._nodes.tolist()
+        self._elements = [tuple(e) for e in self._elements.tolist()]
+        self._boundaries = self._boundaries.tolist()
+        self._storage = "list"
+
+    @property
+    def node_array(self):
+        """
+        Returns the nodes as a float64 array of the shape (N, 2).
+
+        For an array-backed mesh this is the stored array itself, otherwise
+        a new array is created.
+        """
+        if self._storage == "array":
+            return self._nodes
+        return _as_array(self._nodes, "float64", 2)
+
+    @property
+    def element_array(self):
+        """
+        Returns the elements as an int32 array of the shape (M, 3) or (M, 4).
+
+        For an array-backed mesh this is the stored array itself, otherwise
+        a new array is created.
+        """
+        if self._storage == "array":
+            return self._elements
+        return _as_array(self._elements, "int32", 3)
+
+    @property
+    def boundary_array(self):
+        """
+        Returns the boundaries as an int32 array of the shape (B, 3).
+
+        For an array-backed mesh this is the stored array itself, otherwise
+        a new array is created.
+        """
+        if self._storage == "array":
+            return self._boundaries
+        return _as_array(self.boundaries, "int32", 3)
 
     def __str__(self):
         return """Mesh:
@@ -407,12 +698,13 @@ class Mesh:
         boundaries:
         %s
         curves:
-        %s""" % (self._nodes, self._elements, self._boundaries, self._curves)
+        %s""" % (self._nodes, self._elements, self.boundaries, self._curves)
 
     @property
     def nodes(self):
         """
-        Returns the mesh nodes.
+        Returns the mesh nodes (call changed() after modifying them in
+        place).
 
         Example:
 
@@ -432,7 +724,8 @@ class Mesh:
     @property
     def elements(self):
         """
-        Returns the mesh elements.
+        Returns the mesh elements (call changed() after modifying them in
+        place).
 
         Example:
 
@@ -523,18 +816,27 @@ class Mesh:
         """
         return self._curves
 
-    def plot(self, filename="a.png"):
+    def plot(self, filename="a.png", colors=None, max_elements=50000):
         """
         Plots the mesh using matplotlib.
 
+        All edges are drawn at once, each edge once. The elements can be
+        filled by "colors" (a value or a matplotlib color per element).
+        Meshes with more than "max_elements" elements are drawn as the
+        boundaries over the raster of the element density. See
+        plot.plot_mesh().
+
         Example:
 
         >>> m = Mesh([[0.0,1.0],[1.0,1.0],[1.0,0.0],[0.0,0.0],],[[1,0,2],[2,0,3],],[[3,2,1],[2,1,2],[1,0,3],[0,3,4],],[])
         >>> m.plot() # plots the mesh
+        >>> m.plot(colors=[0.5, 1.0]) # colors the elements
 
         """
-        import triangulation
-        triangulation.plot_tria_mesh(self._nodes, self._elements, filename=filename)
+        from plot import plot_mesh
+        plot_mesh(self.node_array, self.element_array, filename=filename,
+                colors=colors, boundaries=self.boundary_array[:, :2],
+                max_elements=max_elements)
 
     def show(self, filename="a.png"):
         """
@@ -622,7 +924,7 @@ class Mesh:
         </html> """ % {"path": path, "cn": self._cell_id_edit,
             "nodes": self._convert_nodes(self._nodes),
             "elements": self._convert_elements(self._elements),
-            "boundaries": self._convert_boundaries(self._boundaries),
+            "boundaries": self._convert_boundaries(self.boundaries),
             "curves": self._convert_curves(self._curves),
             "var_name": self_name}
         else:
@@ -648,8 +950,13 @@ class Mesh:
             from hermes2d import Mesh
             m = Mesh()
             nodes = self._nodes
-            elements = [list(e)+[0] for e in self._elements]
-            boundaries = self._boundaries
+            elements = self._elements
+            boundaries = self.boundaries
+            if self._storage == "array":
+                nodes = nodes.tolist()
+                elements = elements.tolist()
+                boundaries = boundaries.tolist()
+            elements = [list(e)+[0] for e in elements]
             curves = self._curves
             m.create(nodes, elements, boundaries, curves)
             return m
@@ -675,10 +982,13 @@ class Mesh:
                 self_name = var
         print self.get_html(self_name=self_name, editor=editor)
 
-    def check_element_orientations(self):
+    def check_element_orientations(self, return_inverted=False):
         """
         Checks whether all elements are positively oriented.
 
+        If "return_inverted" is True, the list of indices of the elements
+        that are not positively oriented is returned instead.
+
         Example:
 
         >>> from femhub import Mesh
@@ -692,25 +1002,73 @@ class Mesh:
         >>> mesh2 = Mesh(nodes, elems2, bdy)
         >>> mesh2.check_element_orientations()
         False
+        >>> mesh2.check_element_orientations(return_inverted=True)
+        [0]
+
+        """
+        positive = self.element_geometry()["positive"]
+        if return_inverted:
+            return (~positive).nonzero()[0].tolist()
+        return bool(positive.all())
+
+    def quality(self, bins=10):
+        """
+        Returns the quality report of the mesh.
+
+        The report is a dictionary with the per element arrays "min_angle",
+        "max_angle", "aspect_ratio", "radius_ratio" and "area" (see
+        geometry.element_quality()) and "histograms" with their histograms
+        with "bins" bins (see geometry.quality_histograms()). It is computed
+        from the cached element_geometry().
+
+        Example:
+
+        >>> m = Mesh([[0.0,1.0],[1.0,1.0],[1.0,0.0],[0.0,0.0],],[[1,0,2],[2,0,3],],[[3,2,1],[2,1,2],[1,0,3],[0,3,4],],[])
+        >>> q = m.quality()
+        >>> q["max_angle"].round(6).tolist()
+        [90.0, 90.0]
+        >>> q["histograms"]["max_angle"][0].tolist()
+        [0, 0, 0, 0, 0, 2, 0, 0, 0, 0]
 
         """
+        from geometry import element_quality, quality_histograms
+        q = element_quality(self._nodes, self._elements,
+                self.element_geometry())
+        q["histograms"] = quality_histograms(q, bins)
+        return q
+
+    def poor_elements(self, min_angle=None, max_angle=None,
+            max_aspect_ratio=None, min_radius_ratio=None, min_area=None):
+        """
+        Returns the sorted list of the elements that violate any of the
+        given bounds (see quality(), the angles are in degrees).
+
+        Example:
 
-        ok = True
-        for elem in self.elems:
-            a,b,c = elem
-            ax = self.nodes[a][0]
-            ay = self.nodes[a][1]
-            bx = self.nodes[b][0]
-            by = self.nodes[b][1]
-            cx = self.nodes[c][0]
-            cy = self.nodes[c][1]
-            abx = bx - ax
-            aby = by - ay
-            acx = cx - ax
-            acy = cy - ay
-            z = abx*acy - aby*acx
-            if z <= 0: ok = False
-        return ok
+        >>> m = Mesh([[0.,0.],[1.,0.],[1.,1.],[0.,1.],[0.9,0.5]],[(0,1,4),(1,2,4),(2,3,4),(3,0,4)],[[0,1,1],[1,2,1],[2,3,1],[3,0,1]],[])
+        >>> m.poor_elements(min_angle=20)
+        [1]
+        >>> m.poor_elements(max_angle=120, min_area=0.2)
+        [1]
+        >>> m.poor_elements(min_radius_ratio=0.8)
+        [0, 1, 2]
+
+        """
+        from geometry import element_quality
+        q = element_quality(self._nodes, self._elements,
+                self.element_geometry())
+        bad = q["area"] != q["area"]
+        if min_angle is not None:
+            bad |= q["min_angle"] < min_angle
+        if max_angle is not None:
+            bad |= q["max_angle"] > max_angle
+        if max_aspect_ratio is not None:
+            bad |= q["aspect_ratio"] > max_aspect_ratio
+        if min_radius_ratio is not None:
+            bad |= q["radius_ratio"] < min_radius_ratio
+        if min_area is not None:
+            bad |= q["area"] < min_area
+        return bad.nonzero()[0].tolist()
 
     def look_up_node(self, x, y, min_edge_length):
         """
@@ -720,6 +1078,10 @@ class Mesh:
         found, return its index. If not, append it to the end of the
         list and return its index.
 
+        The nodes are hashed into a grid with the cell size equal to the
+        tolerance, so only the nodes in the neighbouring cells are checked.
+        The grid is kept up to date as nodes are appended.
+
         Example:
 
         >>> from femhub import Mesh
@@ -736,25 +1098,68 @@ class Mesh:
         [[-1.0, -1.0], [1.0, -1.0], [-1.0, 1.0], [1.0, 1.0]]
 
         """
-        counter = 0
-        for node in self.nodes:
-            x0, y0 = node
-            dx = float(x0 - x)
-            dy = float(y0 - y)
-            if sqrt(dx**2 + dy**2) < 0.01*min_edge_length:
-                found = 1
-                return counter
-            counter += 1
-        self.nodes.append([x, y])
+        self.use_lists()
+        tol = 0.01*min_edge_length
+        nodes = self._nodes
+        if tol > 0:
+            grid = self._node_index(tol)
+            found = None
+            for i in grid.query(x - tol, y - tol, x + tol, y + tol):
+                x0, y0 = nodes[i]
+                dx = float(x0 - x)
+                dy = float(y0 - y)
+                if sqrt(dx**2 + dy**2) < tol:
+                    if found is None or i < found:
+                        found = i
+            if found is not None:
+                return found
+        counter = len(nodes)
+        nodes.append([x, y])
+        self._version += 1
+        if self._node_grid is not None:
+            self._node_grid.insert_point(counter, x, y)
+            self._node_grid_count += 1
         return counter
 
-    def triangulate(self, debug=False):
+    def _node_index(self, tol):
+        """
+        Returns the BucketGrid with the cell size "tol" holding the indices
+        of all nodes.
+
+        The grid is kept between the calls, nodes appended to the list since
+        the last call are added to it.
+        """
+        nodes = self._nodes
+        key = (id(nodes), tol)
+        if self._node_grid is None or self._node_grid_key != key or \
+                self._node_grid_count > len(nodes):
+            from spatial import BucketGrid
+            self._node_grid = BucketGrid(tol)
+            self._node_grid_key = key
+            self._node_grid_count = 0
+        grid = self._node_grid
+        for i in range(self._node_grid_count, len(nodes)):
+            x, y = nodes[i]
+            grid.insert_point(i, x, y)
+        self._node_grid_count = len(nodes)
+        return grid
+
+    def triangulate(self, debug=False, method="af", size=None):
         """
         Triangulates the domain.
 
         Returns an instance of the Mesh() class that contains the triangular
         mesh.
 
+        The "method" selects the triangulation algorithm, see
+        triangulation.triangulate() for the list of methods.
+
+        If the target element "size" is given (a number, a function
+        h(x, y) or a spatial.BackgroundGrid), new nodes are created inside
+        the domain, so that the elements have about this size. The boundary
+        edges are split to this size first and the parts keep the marker of
+        the edge; the curved edges are not split.
+
         Example:
 
         >>> d = Domain([[0, 1], [1, 1], [1, 0], [0, 0]], [(0, 3), (3, 2), (2, 1), (1, 0)])
@@ -767,21 +1172,40 @@ class Mesh:
         [(1, 0, 2), (2, 0, 3)]
         >>> m.boundaries
         [[0, 3, 1], [3, 2, 1], [2, 1, 1], [1, 0, 1]]
+        >>> m = Mesh([[0, 1], [1, 1], [1, 0], [0, 0]], [], [[0, 3, 1], [3, 2, 2], [2, 1, 3], [1, 0, 4]])
+        >>> m.triangulate(size=0.5)
+        >>> m.boundaries
+        [[0, 4, 1], [4, 3, 1], [3, 5, 2], [5, 2, 2], [2, 6, 3], [6, 1, 3], [1, 7, 4], [7, 0, 4]]
 
         """
-        from triangulation import triangulate_af
+        from triangulation import triangulate, split_boundary
         if debug:
             print "Triangulating..."
             print "List of points:", self._nodes
-            print "List of boundary edges:", self._boundaries
+            print "List of boundary edges:", self.boundaries
 
+        storage = self._storage
+        self.use_lists()
         boundaries = [(b[0],b[1]) for b in self._boundaries]
-        elems = triangulate_af(self._nodes, boundaries)
+        if size is not None:
+            # new lists, the old ones may be shared with the caller
+            self._nodes = list(self._nodes)
+            curved = [(c[0], c[1]) for c in self._curves]
+            boundaries, origin = split_boundary(self._nodes, boundaries,
+                    size, keep=curved)
+            self._boundaries = [list(e) + list(self._boundaries[i][2:])
+                for e, i in zip(boundaries, origin)]
+        elems = triangulate(self._nodes, boundaries, method=method,
+                size=size)
         #boundaries = [list(b)+[1] for b in self._edges]
         if debug:
             print "List of elements:", elems
 
         self._elements = elems
+        self._history = {}
+        self.changed()
+        if storage == "array":
+            self.use_arrays()
 
     def refine_element(self, elem, min_edge_length):
         """
@@ -820,9 +1244,19 @@ class Mesh:
             [[0, 3, 1], [3, 1, 1], [1, 4, 2], [4, 2, 2], [2, 5, 3], [5, 0, 3]]
         curves:
             []
+        >>> mesh = Mesh([[0.0,1.0],[1.0,1.0],[1.0,0.0],[0.0,0.0]], [[1,0,2],[2,0,3]], [[3,2,1],[2,1,2],[1,0,3],[0,3,4]])
+        >>> mesh.use_arrays()
+        >>> mesh.refine_element(mesh.elements[0], mesh.calc_min_edge_length())
+        >>> mesh.elements
+        [(2, 0, 3), (1, 4, 6), (4, 0, 5), (6, 4, 5), (6, 5, 2)]
 
         """
         assert len(elem) == 3
+        # a row of the element array does not compare as a single value
+        elem = tuple(int(v) for v in elem)
+        self.use_lists()
+        # the nodes are only appended, so the node index stays valid
+        self._version += 1
         a, b, c = elem
         ax = self.nodes[a][0]
         ay = self.nodes[a][1]
@@ -830,7 +1264,11 @@ class Mesh:
         by = self.nodes[b][1]
         cx = self.nodes[c][0]
         cy = self.nodes[c][1]
-        self.elems.remove(elem)
+        try:
+            self.elems.remove(elem)
+        except ValueError:
+            # the elements were given as lists
+            self.elems.remove(list(elem))
         d = self.look_up_node((ax + bx)/2., (ay + by)/2., min_edge_length)
         e = self.look_up_node((bx + cx)/2., (by + cy)/2., min_edge_length)
         f = self.look_up_node((cx + ax)/2., (cy + ay)/2., min_edge_length)
@@ -838,22 +1276,104 @@ class Mesh:
         self.elems.append((d, b, e))
         self.elems.append((f, d, e))
         self.elems.append((f, e, c))
+        self._record_refinement(elem, [(a, d, f), (d, b, e), (f, d, e),
+            (f, e, c)], [d, e, f])
         # updating the list of bdy edges if necessary
-        bdy_temp = self.bdy[:]
-        for edge in bdy_temp:
+        index = self._boundary_index()
+        bdy = self._boundaries
+        positions = set()
+        for key in [(a, b), (b, c), (c, a)]:
+            positions.update(index.get((min(key), max(key)), ()))
+        for pos in sorted(positions):
+            edge = bdy[pos]
             a0,b0,marker = edge
             if (a == a0 and b == b0) or (b == a0 and a == b0):
-                self.bdy.remove(edge)
-                self.bdy.append([a,d,marker])
-                self.bdy.append([d,b,marker])
+                self._remove_boundary(pos)
+                self._append_boundary([a,d,marker])
+                self._append_boundary([d,b,marker])
             if (b == a0 and c == b0) or (c == a0 and b == b0):
-                self.bdy.remove(edge)
-                self.bdy.append([b,e,marker])
-                self.bdy.append([e,c,marker])
+                self._remove_boundary(pos)
+                self._append_boundary([b,e,marker])
+                self._append_boundary([e,c,marker])
             if (c == a0 and a == b0) or (a == a0 and c == b0):
-                self.bdy.remove(edge)
-                self.bdy.append([c,f,marker])
-                self.bdy.append([f,a,marker])
+                self._remove_boundary(pos)
+                self._append_boundary([c,f,marker])
+                self._append_boundary([f,a,marker])
+        self._compact_boundaries()
+
+    def _boundary_index(self):
+        """
+        Returns the dictionary mapping the sorted node pairs (a, b) to the
+        positions of the boundary edges between "a" and "b" in
+        self._boundaries.
+
+        The index (together with the set of the boundary nodes) is rebuilt
+        when the boundary list was replaced or changed its length since the
+        last call, otherwise it is updated by _remove_boundary() and
+        _append_boundary().
+        """
+        bdy = self._boundaries
+        if self._bdy_index is None or self._bdy_key != (id(bdy), len(bdy)):
+            index = {}
+            nodes = set()
+            for pos, edge in enumerate(bdy):
+                a, b = int(edge[0]), int(edge[1])
+                index.setdefault((min(a, b), max(a, b)), []).append(pos)
+                nodes.add(a)
+                nodes.add(b)
+            self._bdy_index = index
+            self._bdy_nodes = nodes
+            self._bdy_key = (id(bdy), len(bdy))
+        return self._bdy_index
+
+    def _remove_boundary(self, pos):
+        """
+        Removes the boundary edge at the position "pos" from the index.
+
+        The edge stays in the list, so that the positions of the other
+        edges do not change, until _compact_boundaries() drops it. The
+        methods that remove edges call it before they return.
+        """
+        a, b = self._boundaries[pos][:2]
+        key = (min(a, b), max(a, b))
+        positions = self._bdy_index[key]
+        positions.remove(pos)
+        if not positions:
+            del self._bdy_index[key]
+        self._bdy_removed.add(pos)
+
+    def _append_boundary(self, edge):
+        """
+        Appends the boundary edge [a, b, marker].
+        """
+        a, b = edge[:2]
+        self._bdy_index.setdefault((min(a, b), max(a, b)), []).append(
+                len(self._boundaries))
+        self._bdy_nodes.add(a)
+        self._bdy_nodes.add(b)
+        self._boundaries.append(edge)
+
+    def _compact_boundaries(self):
+        """
+        Drops the edges removed by _remove_boundary() from the boundary list
+        and updates the positions in the index.
+
+        The list is modified in place and the other edges keep their order,
+        as if each removed edge was removed from the list at once (the
+        edges appended meanwhile stay after the old ones).
+        """
+        removed = self._bdy_removed
+        bdy = self._boundaries
+        if removed:
+            bdy[:] = [edge for pos, edge in enumerate(bdy)
+                if pos not in removed]
+            index = {}
+            for pos, edge in enumerate(bdy):
+                a, b = int(edge[0]), int(edge[1])
+                index.setdefault((min(a, b), max(a, b)), []).append(pos)
+            self._bdy_index = index
+            self._bdy_removed = set()
+        self._bdy_key = (id(bdy), len(bdy))
 
     def refine_all_elements(self):
         """
@@ -874,10 +1394,577 @@ class Mesh:
         (22, 21, 7), (8, 22, 24), (22, 7, 23), (24, 22, 23), (24, 23, 3)]
 
         """
+        storage = self._storage
+        self.use_lists()
         elems_tmp = self.elems[:]
         min_edge_length = self.calc_min_edge_length()
         for elem in elems_tmp:
             self.refine_element(elem, min_edge_length)
+        if storage == "array":
+            self.use_arrays()
+
+    def refine_uniform(self, levels=1):
+        """
+        Refines all elements uniformly "levels" times.
+
+        Gives the same mesh as refine_all_elements() (up to the numbering
+        of the nodes and elements), but each level is done in a few array
+        operations (see refinement.refine_red()), so it is fast for large
+        meshes. The mesh keeps its storage, but for large meshes it is much
+        faster to call use_arrays() first. The refinement history (see
+        coarsen_marked()) is not recorded and is discarded.
+
+        Example:
+
+        >>> m = Mesh([[0.0,1.0],[1.0,1.0],[1.0,0.0],[0.0,0.0],],[[1,0,2],[2,0,3],],[[3,2,1],[2,1,2],[1,0,3],[0,3,4],],[])
+        >>> m.refine_uniform()
+        >>> m.elems
+        [(1, 4, 7), (4, 0, 5), (7, 4, 5), (7, 5, 2), (2, 5, 8), (5, 0, 6), (8, 5, 6), (8, 6, 3)]
+        >>> m.bdy
+        [[3, 8, 1], [8, 2, 1], [2, 7, 2], [7, 1, 2], [1, 4, 3], [4, 0, 3], [0, 6, 4], [6, 3, 4]]
+        >>> m.refine_uniform(2)
+        >>> len(m.elems), len(m.nodes), len(m.bdy)
+        (128, 81, 32)
+
+        """
+        from refinement import refine_red
+        nodes = self.node_array
+        elements = self.element_array
+        boundaries = self.boundary_array
+        for i in range(levels):
+            nodes, elements, boundaries = refine_red(nodes, elements,
+                    boundaries)
+        storage = self._storage
+        self._nodes = nodes
+        self._elements = elements
+        self._boundaries = boundaries
+        self._storage = "array"
+        self._history = {}
+        self.changed()
+        if storage == "list":
+            self.use_lists()
+
+    def refine_marked(self, indicators, fraction=0.5):
+        """
+        Refines the elements with the largest error indicators.
+
+        "indicators" are the (nonnegative) error indicators of all elements.
+        The elements with the largest ones are marked until their sum
+        reaches "fraction" of the total (see refinement.mark_bulk()), and
+        refined by bisect_elements(). Returns the list of the bisections
+        done (see bisect_elements()).
+
+        Example:
+
+        >>> m = Mesh([[0.0,1.0],[1.0,1.0],[1.0,0.0],[0.0,0.0],],[[1,0,2],[2,0,3],],[[3,2,1],[2,1,2],[1,0,3],[0,3,4],],[])
+        >>> m.refine_marked([1., 0.], 0.5)
+        [(0, 2, 4), (1, 3, 5), (1, 4, 4)]
+        >>> m.elems
+        [(4, 1, 0), (4, 5, 2), (4, 2, 1), (5, 3, 2), (4, 0, 5)]
+        >>> m.check_element_orientations()
+        True
+
+        The element 1 was bisected twice, first by its own refinement edge
+        (0, 3) and then by the edge (0, 2) shared with the element 0.
+
+        """
+        from refinement import mark_bulk
+        if len(indicators) != len(self._elements):
+            raise ValueError("There must be one indicator per element.")
+        return self.bisect_elements(mark_bulk(indicators, fraction))
+
+    def bisect_elements(self, elements):
+        """
+        Refines the given elements by the newest vertex bisection.
+
+        "elements" is a list of element indices. For the element (a, b, c)
+        the vertex "a" is the newest one, the element is halved by the
+        midpoint p of the edge (b, c) into (p, a, b), which replaces it, and
+        (p, c, a), which is appended to the elements. Neighbouring elements
+        are bisected as well to keep the mesh conforming, and boundary edges
+        that are split are replaced by their halves with the same marker.
+
+        Returns the list of the bisections done, as triples (parent index,
+        index of the appended child, new node).
+
+        The edge to element map is kept between the calls (it is rebuilt
+        only after the mesh was changed otherwise), so the work done is
+        proportional to the number of the new elements. Keep the mesh in
+        the list storage for this, the array storage is converted to lists
+        and back each time.
+
+        Example:
+
+        >>> nodes = [[0.0,1.0],[1.0,1.0],[1.0,0.0],[0.0,0.0],]
+        >>> bdy = [[3,2,1],[2,1,2],[1,0,3],[0,3,4],]
+        >>> m = Mesh(nodes,[[1,0,2],[2,0,3],],bdy,[])
+        >>> m.bisect_elements([0])
+        [(0, 2, 4), (1, 3, 5), (1, 4, 4)]
+        >>> m.bisect_elements([0])
+        [(0, 5, 6)]
+        >>> m.elems
+        [(6, 4, 1), (4, 5, 2), (4, 2, 1), (5, 3, 2), (4, 0, 5), (6, 0, 4)]
+        >>> m.bdy
+        [[3, 2, 1], [2, 1, 2], [0, 5, 4], [5, 3, 4], [1, 6, 3], [6, 0, 3]]
+        >>> None in bdy, len(nodes)
+        (False, 4)
+
+        """
+        from refinement import Bisection
+        storage = self._storage
+        self.use_lists()
+        key = (id(self._nodes), id(self._elements), len(self._elements))
+        if self._bisection is None or self._bisection_key != key:
+            # the new nodes are appended to a new list, the old one may be
+            # shared (e.g. with the Domain)
+            self._nodes = list(self._nodes)
+            self._bisection = Bisection(self._nodes, self._elements)
+        index = self._boundary_index()
+        bdy = self._boundaries
+        def split_boundary(a, b, p):
+            key = (min(a, b), max(a, b))
+            while key in index:
+                pos = index[key][0]
+                a0, b0, marker = bdy[pos]
+                self._remove_boundary(pos)
+                self._append_boundary([a0, p, marker])
+                self._append_boundary([p, b0, marker])
+        def record(parent, child1, child2, p):
+            self._record_refinement(parent, [child1, child2], [p])
+        bisections = self._bisection.refine(elements, split_boundary, record)
+        self._compact_boundaries()
+        self._bisection_key = (id(self._nodes), id(self._elements),
+                len(self._elements))
+        self._version += 1
+        if storage == "array":
+            self.use_arrays()
+        return bisections
+
+    def _record_refinement(self, parent, children, nodes):
+        """
+        Records that "parent" was refined into "children" (lists of element
+        triples) by adding the new nodes "nodes".
+        """
+        group = (tuple(parent), [tuple(c) for c in children], list(nodes))
+        for c in group[1]:
+            self._history[c] = group
+
+    @property
+    def history(self):
+        """
+        Returns the refinement history.
+
+        It is a dictionary mapping each element created by
+        refine_element(), refine_all_elements() or bisect_elements() to the
+        tuple (parent, children, nodes), where "nodes" are the midpoints
+        added when the parent was refined. coarsen_marked() uses it to
+        merge the children back.
+
+        Example:
+
+        >>> m = Mesh([[0.0,1.0],[1.0,1.0],[1.0,0.0],[0.0,0.0],],[[1,0,2],[2,0,3],],[[3,2,1],[2,1,2],[1,0,3],[0,3,4],],[])
+        >>> m.bisect_elements([1])
+        [(1, 2, 4)]
+        >>> m.history[(4, 2, 0)]
+        ((2, 0, 3), [(4, 2, 0), (4, 3, 2)], [4])
+
+        """
+        return self._history
+
+    def coarsen_marked(self, marked):
+        """
+        Merges marked elements back into their parents.
+
+        "marked" is a list of element indices. All children of a parent
+        (see history) are merged back into it, if all of them are marked
+        and are not refined, and if the nodes added by the refinement are
+        not used by any other element (so that the mesh stays conforming).
+        Such merges are done together, e.g. the two pairs of triangles
+        around a bisected edge. The parent takes the place of its first
+        child. Boundary edges are merged back as well and the nodes that
+        are no longer used are removed.
+
+        Only one level is coarsened, call it again to coarsen further.
+
+        Returns the list mapping the old node indices to the new ones (None
+        for the removed nodes).
+
+        Example:
+
+        >>> nodes = [[0.0,1.0],[1.0,1.0],[1.0,0.0],[0.0,0.0],]
+        >>> m = Mesh(nodes,[[1,0,2],[2,0,3],],[[3,2,1],[2,1,2],[1,0,3],[0,3,4],],[])
+        >>> m.bisect_elements([0])
+        [(0, 2, 4), (1, 3, 5), (1, 4, 4)]
+        >>> m.elems
+        [(4, 1, 0), (4, 5, 2), (4, 2, 1), (5, 3, 2), (4, 0, 5)]
+        >>> m.coarsen_marked(range(5))
+        [0, 1, 2, 3, None, 4]
+        >>> m.elems
+        [(1, 0, 2), (4, 2, 0), (4, 3, 2)]
+        >>> m.coarsen_marked(range(3))
+        [0, 1, 2, 3, None]
+        >>> m.elems
+        [(1, 0, 2), (2, 0, 3)]
+        >>> m.bdy
+        [[3, 2, 1], [2, 1, 2], [1, 0, 3], [0, 3, 4]]
+
+        The node list passed to Mesh() is not changed, the mesh gets a new
+        list:
+
+        >>> len(m.nodes), len(nodes)
+        (4, 4)
+
+        """
+        storage = self._storage
+        self.use_lists()
+        elems = self._elements
+        history = self._history
+        position = {}
+        for i, elem in enumerate(elems):
+            position[tuple(elem)] = i
+        marked = set(marked)
+        groups = {}
+        for i in marked:
+            group = history.get(tuple(elems[i]))
+            if group is None or id(group) in groups:
+                continue
+            ok = True
+            for c in group[1]:
+                if position.get(c) not in marked:
+                    ok = False
+                    break
+            if ok:
+                groups[id(group)] = group
+        # the elements using the new nodes of the groups
+        users = {}
+        for group in groups.values():
+            for n in group[2]:
+                users[n] = []
+        if users:
+            for elem in elems:
+                for n in elem:
+                    if n in users:
+                        users[n].append(tuple(elem))
+        # drop the groups whose nodes would still be used after the merge,
+        # by elements outside of the merged groups or by merged parents
+        done = False
+        while not done:
+            done = True
+            owner = {}
+            kept = set()
+            for key, group in groups.items():
+                kept.update(group[0])
+                for c in group[1]:
+                    owner[c] = key
+            for key, group in groups.items():
+                for n in group[2]:
+                    if n in kept or [e for e in users[n] if e not in owner]:
+                        del groups[key]
+                        done = False
+                        break
+        if not groups:
+            if storage == "array":
+                self.use_arrays()
+            return range(len(self._nodes))
+        removed = [False]*len(elems)
+        for group in groups.values():
+            pos = [position[c] for c in group[1]]
+            first = min(pos)
+            elems[first] = group[0]
+            for i in pos:
+                if i != first:
+                    removed[i] = True
+            for c in group[1]:
+                del history[c]
+        elems[:] = [elem for i, elem in enumerate(elems) if not removed[i]]
+        # merge the boundary edges at the removed nodes
+        old_nodes = set()
+        for group in groups.values():
+            old_nodes.update(group[2])
+        bdy = self._boundaries
+        starts = {}
+        ends = {}
+        for pos, edge in enumerate(bdy):
+            if edge[0] in old_nodes:
+                starts[edge[0]] = pos
+            if edge[1] in old_nodes:
+                ends[edge[1]] = pos
+        dropped = [False]*len(bdy)
+        for n in ends:
+            if n in starts:
+                i, j = ends[n], starts[n]
+                merged = [bdy[i][0], bdy[j][1]] + list(bdy[i][2:])
+                bdy[min(i, j)] = merged
+                dropped[max(i, j)] = True
+        bdy[:] = [edge for i, edge in enumerate(bdy) if not dropped[i]]
+        # remove the unused nodes
+        new_index = []
+        nodes = []
+        for i, node in enumerate(self._nodes):
+            if i in old_nodes:
+                new_index.append(None)
+            else:
+                new_index.append(len(nodes))
+                nodes.append(node)
+        # a new list, the old one may be shared (e.g. with the Domain)
+        self._nodes = nodes
+        elems[:] = [tuple([new_index[n] for n in elem]) for elem in elems]
+        bdy[:] = [[new_index[edge[0]], new_index[edge[1]]] + list(edge[2:])
+            for edge in bdy]
+        self._curves = [[new_index[c[0]], new_index[c[1]]] + list(c[2:])
+            for c in self._curves]
+        new_history = {}
+        left = dict([(id(g), g) for g in history.values()])
+        for group in left.values():
+            group = (tuple([new_index[n] for n in group[0]]),
+                    [tuple([new_index[n] for n in c]) for c in group[1]],
+                    [new_index[n] for n in group[2]])
+            for c in group[1]:
+                new_history[c] = group
+        self._history = new_history
+        self.changed()
+        if storage == "array":
+            self.use_arrays()
+        return new_index
+
+    def improve_quality(self, min_angle=20., max_area=None, max_nodes=None):
+        """
+        Refines the mesh until no angle is smaller than "min_angle"
+        (degrees) and no element is larger than "max_area".
+
+        The elements are replaced by the constrained Delaunay triangulation
+        of the nodes, which is then refined by inserting the circumcenters
+        of the worst elements first (Ruppert's algorithm, see
+        delaunay.refine_quality()). The boundary edges encroached by a
+        circumcenter are split instead, their parts keep the marker. The
+        boundaries must be oriented as for triangulate(). The old nodes keep
+        their indices, the new ones are appended.
+
+        The bound is guaranteed for min_angle up to about 20 degrees, larger
+        angles (up to about 33 degrees) usually work too. The elements at the
+        boundary corners with an angle below 60 degrees may stay worse. At
+        most "max_nodes" nodes are added (if given). The refinement history
+        (see coarsen_marked()) is discarded.
+
+        Example:
+
+        >>> nodes = [[0.0,1.0],[1.0,1.0],[1.0,0.0],[0.0,0.0],]
+        >>> m = Mesh(nodes,[[1,0,2],[2,0,3],],[[3,2,1],[2,1,2],[1,0,3],[0,3,4],],[])
+        >>> m.improve_quality(max_area=0.2)
+        >>> len(m.nodes), len(m.elements), len(nodes)
+        (9, 8, 4)
+        >>> m.bdy
+        [[3, 8, 1], [8, 2, 1], [2, 6, 2], [6, 1, 2], [1, 7, 3], [7, 0, 3], [0, 5, 4], [5, 3, 4]]
+        >>> m.check_element_orientations()
+        True
+
+        """
+        from delaunay import refine_quality
+        storage = self._storage
+        self.use_lists()
+        boundaries = self.boundaries
+        nodes, elems, bdy = refine_quality(self._nodes, boundaries,
+                min_angle=min_angle, max_area=max_area, max_points=max_nodes)
+        # a new list, the old one may be shared (e.g. with the Domain)
+        self._nodes = self._nodes + [list(p) for p in
+                nodes[len(self._nodes):]]
+        self._elements = elems
+        self._boundaries = bdy
+        self._history = {}
+        self.changed()
+        if storage == "array":
+            self.use_arrays()
+
+    def smooth(self, iterations=1, method="laplacian"):
+        """
+        Moves the interior nodes to improve the shape of the elements.
+
+        Each of the "iterations" sweeps moves all nodes at once, by the
+        "method" "laplacian" (to the average of the neighbouring nodes) or
+        "odt" (to the area weighted average of the circumcenters of the
+        surrounding triangles), see smoothing.smooth(). The boundary nodes
+        (see is_boundary_node()) stay fixed and the moves that would invert
+        an element are rejected.
+
+        Returns a dictionary with the element quality "before" and "after"
+        the smoothing (see geometry.element_quality()) and the number of
+        "rejected" moves.
+
+        Example:
+
+        >>> nodes = [[0.,0.],[2.,0.],[0.,2.],[2.,2.],[0.2,1.5]]
+        >>> m = Mesh(nodes,[(0,1,4),(1,3,4),(3,2,4),(2,0,4)],[[0,1,1],[1,3,1],[3,2,1],[2,0,1]],[])
+        >>> r = m.smooth()
+        >>> m.nodes[4], nodes[4]
+        ([1.0, 1.0], [0.2, 1.5])
+        >>> round(r["before"]["min_angle"].min(), 2), round(r["after"]["min_angle"].min(), 2)
+        (7.59, 45.0)
+
+        """
+        from smoothing import smooth
+        from geometry import element_quality
+        nodes = self.node_array
+        elements = self.element_array
+        self._boundary_index()
+        fixed = [False]*len(nodes)
+        for i in self._bdy_nodes:
+            fixed[i] = True
+        before = element_quality(nodes, elements)
+        new_nodes, rejected = smooth(nodes, elements, fixed,
+                iterations=iterations, method=method)
+        if self._storage == "array":
+            self._nodes = new_nodes
+        else:
+            # a new list, the old one may be shared (e.g. with the Domain)
+            self._nodes = new_nodes.tolist()
+        self.changed()
+        return {"before": before,
+                "after": element_quality(new_nodes, elements),
+                "rejected": rejected}
+
+    def renumber(self, method="rcm", elements=False):
+        """
+        Renumbers the nodes to reduce the bandwidth of the assembled
+        matrices and improve the memory locality.
+
+        The "method" is "rcm" (reverse Cuthill-McKee on the node graph) or
+        "hilbert" (along the Hilbert curve through the nodes), see the
+        renumbering module. If "elements" is True, the elements are
+        reordered along the Hilbert curve through their centroids. The
+        elements, boundaries, curves and the refinement history are
+        remapped.
+
+        Returns the tuple (node_perm, element_perm) of arrays: the new node
+        i is the old node node_perm[i], so an existing solution vector "u"
+        is renumbered by u[node_perm]. element_perm is None, unless the
+        elements were reordered.
+
+        Example:
+
+        >>> m = Mesh([[0.,0.],[2.,1.],[1.,0.],[0.,1.],[2.,0.],[1.,1.]],[(0,2,3),(2,5,3),(2,4,5),(4,1,5)],[[0,2,1],[2,4,1],[4,1,1],[1,5,1],[5,3,1],[3,0,1]],[])
+        >>> node_perm, element_perm = m.renumber()
+        >>> node_perm.tolist()
+        [0, 3, 2, 5, 4, 1]
+        >>> m.nodes
+        [[0.0, 0.0], [0.0, 1.0], [1.0, 0.0], [1.0, 1.0], [2.0, 0.0], [2.0, 1.0]]
+        >>> m.elems
+        [(0, 2, 1), (2, 3, 1), (2, 4, 3), (4, 5, 3)]
+        >>> m.bdy
+        [[0, 2, 1], [2, 4, 1], [4, 5, 1], [5, 3, 1], [3, 1, 1], [1, 0, 1]]
+
+        """
+        from smoothing import node_adjacency
+        from renumbering import reverse_cuthill_mckee, hilbert_permutation, \
+                inverse_permutation
+        nodes = self.node_array
+        elems = self.element_array
+        if method == "rcm":
+            indptr, indices = node_adjacency(len(nodes), elems)
+            node_perm = reverse_cuthill_mckee(indptr, indices)
+        elif method == "hilbert":
+            node_perm = hilbert_permutation(nodes)
+        else:
+            raise ValueError("Unknown renumbering method: %s" % method)
+        element_perm = None
+        if elements and len(elems) > 0:
+            element_perm = hilbert_permutation(nodes[elems].mean(axis=1))
+        inverse = inverse_permutation(node_perm)
+        new_index = inverse.tolist()
+        if self._storage == "array":
+            self._nodes = nodes[node_perm]
+            self._elements = inverse[elems].astype("int32")
+            if element_perm is not None:
+                self._elements = self._elements[element_perm]
+            bdy = self._boundaries.copy()
+            bdy[:, :2] = inverse[bdy[:, :2]]
+            self._boundaries = bdy
+        else:
+            self._nodes = [self._nodes[i] for i in node_perm.tolist()]
+            if element_perm is not None:
+                elems = [self._elements[i] for i in element_perm.tolist()]
+            else:
+                elems = self._elements
+            self._elements = [tuple([new_index[n] for n in e]) for e in elems]
+            self._boundaries = [[new_index[b[0]], new_index[b[1]]] +
+                    list(b[2:]) for b in self.boundaries]
+        self._curves = [[new_index[c[0]], new_index[c[1]]] + list(c[2:])
+            for c in self._curves]
+        new_history = {}
+        for group in dict([(id(g), g) for g in self._history.values()]).values():
+            group = (tuple([new_index[n] for n in group[0]]),
+                    [tuple([new_index[n] for n in c]) for c in group[1]],
+                    [new_index[n] for n in group[2]])
+            for c in group[1]:
+                new_history[c] = group
+        self._history = new_history
+        self.changed()
+        return node_perm, element_perm
+
+    def partition(self, k, method="inertial"):
+        """
+        Splits the elements into "k" parts of about the same size.
+
+        The element centroids are split by recursive bisection along the
+        principal axis of inertia ("inertial") or along the coordinate axis
+        of the largest extent ("coordinate"), see
+        partitioning.recursive_bisection().
+
+        Returns a dictionary with the keys:
+
+        "parts" ... the array of the part numbers of all elements
+        "interface" ... the sorted array of the nodes shared by several parts
+        "submeshes" ... a list with a dictionary for each part: "mesh" (the
+            part as a Mesh() with the same storage, containing the boundary
+            edges and curves of the part), "nodes" and "elements" (the global
+            indices of its nodes and elements) and "interface" (the local
+            indices of its interface nodes)
+
+        Example:
+
+        >>> m = Mesh([[0.,0.],[1.,0.],[2.,0.],[2.,1.],[1.,1.],[0.,1.]],[(0,1,5),(1,4,5),(1,2,4),(2,3,4)],[[0,1,1],[1,2,1],[2,3,2],[3,4,1],[4,5,1],[5,0,3]],[])
+        >>> p = m.partition(2)
+        >>> p["parts"].tolist(), p["interface"].tolist()
+        ([0, 0, 1, 1], [1, 4])
+        >>> s = p["submeshes"][1]
+        >>> s["mesh"].elements, s["mesh"].boundaries
+        ([(0, 1, 3), (1, 2, 3)], [[0, 1, 1], [1, 2, 2], [2, 3, 1]])
+        >>> s["nodes"].tolist(), s["elements"].tolist(), s["interface"].tolist()
+        ([1, 2, 3, 4], [2, 3], [0, 3])
+
+        """
+        from partitioning import recursive_bisection, interface_nodes, \
+                submesh
+        from numpy import in1d
+        nodes = self.node_array
+        elems = self.element_array
+        boundaries = self.boundary_array
+        if len(elems) > 0:
+            centroids = nodes[elems].mean(axis=1)
+        else:
+            centroids = nodes[:0]
+        parts = recursive_bisection(centroids, k, method)
+        interface = interface_nodes(elems, parts)
+        submeshes = []
+        for p in range(k):
+            selected = (parts == p).nonzero()[0]
+            n, e, b, node_map = submesh(nodes, elems, boundaries, selected)
+            local = dict([(g, i) for i, g in enumerate(node_map.tolist())])
+            edges = set([(min(x, y), max(x, y)) for x, y, marker in
+                b.tolist()])
+            curves = []
+            for c in self._curves:
+                a, b2 = local.get(c[0]), local.get(c[1])
+                if a is not None and b2 is not None and \
+                        (min(a, b2), max(a, b2)) in edges:
+                    curves.append([a, b2] + list(c[2:]))
+            mesh = Mesh.from_arrays(n, e, b, curves)
+            if self._storage == "list":
+                mesh.use_lists()
+            shared = in1d(node_map, interface)
+            submeshes.append({"mesh": mesh, "nodes": node_map,
+                "elements": selected, "interface": shared.nonzero()[0]})
+        return {"parts": parts, "interface": interface,
+                "submeshes": submeshes}
 
     def calc_min_edge_length(self):
         """
@@ -901,20 +1988,9 @@ class Mesh:
 
         """
         min_edge_length = 10e10
-        for elem in self.elems:
-            a, b, c = elem
-            ax = self.nodes[a][0]
-            ay = self.nodes[a][1]
-            bx = self.nodes[b][0]
-            by = self.nodes[b][1]
-            cx = self.nodes[c][0]
-            cy = self.nodes[c][1]
-            ab_length = sqrt((bx - ax)**2 + (by - ay)**2)
-            bc_length = sqrt((cx - bx)**2 + (cy - by)**2)
-            ca_length = sqrt((cx - ax)**2 + (cy - ay)**2)
-            if ab_length < min_edge_length: min_edge_length = ab_length
-            if bc_length < min_edge_length: min_edge_length = bc_length
-            if ca_length < min_edge_length: min_edge_length = ca_length
+        lengths = self.element_geometry()["edge_lengths"]
+        if lengths.size > 0:
+            min_edge_length = min(min_edge_length, float(lengths.min()))
         return min_edge_length
 
     def is_boundary_node(self, i):
@@ -924,6 +2000,8 @@ class Mesh:
 
         Here 'i' is the node's index.
 
+        The boundary nodes are kept in a set, so the query takes O(1) time.
+
         Example:
 
         >>> from femhub import Mesh
@@ -937,8 +2015,5 @@ class Mesh:
         False
 
         """
-        for edge in self.bdy:
-            a,b,marker = edge
-            if i == a or i == b:
-                return True
-        return False
+        self._boundary_index()
+        return i in self._bdy_nodes
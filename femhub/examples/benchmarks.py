@@ -0,0 +1,319 @@
+"""
+Timings of some of the femhub algorithms.
+
+Run all benchmarks by:
+
+>>> from femhub.examples.benchmarks import run
+>>> run() # doctest: +SKIP
+"""
+from time import time
+
+def _fan_sequence(n):
+    """
+    Returns the boundary edges of a convex polygon with "n" vertices and the
+    list of third points, that the advancing front picks when it closes the
+    polygon by a fan of triangles around the vertex 0.
+    """
+    edges = [(i, (i+1) % n) for i in range(n)]
+    return edges, range(n-2, 0, -1)
+
+def front_list(edges, third_points):
+    """
+    The front bookkeeping from triangulate_af() as it used to be: the front
+    is a list of edges.
+    """
+    from femhub.triangulation import is_boundary_edge
+    bdy_edges = edges[:]
+    for c in third_points:
+        a, b = bdy_edges.pop()
+        if is_boundary_edge(c, a, bdy_edges):
+            bdy_edges.remove((c, a))
+        else:
+            bdy_edges.append((a, c))
+        if is_boundary_edge(b, c, bdy_edges):
+            bdy_edges.remove((b, c))
+        else:
+            bdy_edges.append((c, b))
+    return bdy_edges
+
+def front_hashed(edges, third_points):
+    """
+    The front bookkeeping from triangulate_af() using the Front class.
+    """
+    from femhub.triangulation import Front
+    front = Front(edges)
+    for c in third_points:
+        a, b = front.pop()
+        front.close_or_add(c, a)
+        front.close_or_add(b, c)
+    return front.edges()
+
+def bench_front(n=10000):
+    """
+    Times the front bookkeeping for a front with "n" edges, returns the
+    tuple (list time, Front time) in seconds.
+    """
+    edges, third_points = _fan_sequence(n)
+    t = time()
+    r1 = front_list(edges, third_points)
+    t_list = time() - t
+    t = time()
+    r2 = front_hashed(edges, third_points)
+    t_hashed = time() - t
+    assert r1 == r2
+    return t_list, t_hashed
+
+def bench_edges_intersect(n=2000):
+    """
+    Checks n short disjoint edges plus one long diagonal edge for
+    intersections (the edge lengths differ by two orders of magnitude),
+    returns the tuple (time of the pairwise loop, time of
+    any_edges_intersect()) in seconds.
+    """
+    from femhub.triangulation import any_edges_intersect, \
+            edge_intersects_edges
+    rows = int(n**0.5) + 1
+    nodes = []
+    edges = []
+    for k in range(n):
+        x = (k % rows)/float(rows) + 0.005
+        y = (k // rows)/float(rows) + 0.005
+        nodes.extend([[x, y], [x + 0.01, y]])
+        edges.append((2*k, 2*k + 1))
+    nodes.extend([[0., 0.003], [1., 1.003]])
+    edges.append((2*n, 2*n + 1))
+    t = time()
+    for i, e in enumerate(edges):
+        edge_intersects_edges(e, nodes, edges[i+1:])
+    t_loop = time() - t
+    t = time()
+    any_edges_intersect(nodes, edges)
+    return t_loop, time() - t
+
+def _grid_mesh(n):
+    """
+    Returns the nodes, elements and boundaries of a mesh of the unit square
+    with n x n cells, each split into two triangles.
+    """
+    nodes = []
+    for j in range(n+1):
+        for i in range(n+1):
+            nodes.append([float(i)/n, float(j)/n])
+    elements = []
+    for j in range(n):
+        for i in range(n):
+            a = j*(n+1) + i
+            b = a + 1
+            c = a + n + 1
+            d = c + 1
+            elements.append((a, b, d))
+            elements.append((a, d, c))
+    boundaries = []
+    for i in range(n):
+        boundaries.append([i, i+1, 1])
+    for j in range(n):
+        boundaries.append([j*(n+1) + n, (j+1)*(n+1) + n, 2])
+    for i in range(n, 0, -1):
+        boundaries.append([n*(n+1) + i, n*(n+1) + i-1, 3])
+    for j in range(n, 0, -1):
+        boundaries.append([j*(n+1), (j-1)*(n+1), 4])
+    return nodes, elements, boundaries
+
+def _list_size(rows):
+    """
+    Returns the number of bytes taken by the list of rows "rows".
+    """
+    from sys import getsizeof
+    size = getsizeof(rows)
+    for row in rows:
+        size += getsizeof(row)
+        for x in row:
+            size += getsizeof(x)
+    return size
+
+def bench_mesh_storage(n=200):
+    """
+    Compares the list and the array storage of a Mesh() with 2*n*n elements,
+    returns the dictionary with the memory (in bytes) taken by the nodes and
+    elements and the times of calc_min_edge_length() and
+    check_element_orientations() for both storages.
+    """
+    from femhub.domain import Mesh
+    nodes, elements, boundaries = _grid_mesh(n)
+    m = Mesh(nodes, elements, boundaries)
+    result = {}
+    result["list memory"] = _list_size(nodes) + _list_size(elements)
+    t = time()
+    l1 = m.calc_min_edge_length()
+    ok1 = m.check_element_orientations()
+    result["list time"] = time() - t
+    m.use_arrays()
+    result["array memory"] = m.nodes.nbytes + m.elements.nbytes
+    t = time()
+    l2 = m.calc_min_edge_length()
+    ok2 = m.check_element_orientations()
+    result["array time"] = time() - t
+    assert abs(l1 - l2) < 1e-12 and ok1 == ok2
+    return result
+
+def bench_refine_uniform(n=10, levels=6):
+    """
+    Refines a mesh with 2*n*n elements uniformly "levels" times, returns the
+    tuple (number of elements, time in seconds).
+    """
+    from femhub.domain import Mesh
+    m = Mesh(*_grid_mesh(n))
+    m.use_arrays()
+    t = time()
+    m.refine_uniform(levels)
+    return len(m.elements), time() - t
+
+def bench_improve_quality(max_area=4e-5):
+    """
+    Refines the unit square mesh by improve_quality() to elements not
+    larger than "max_area", returns the tuple (number of elements, time in
+    seconds).
+    """
+    from femhub.domain import Mesh
+    m = Mesh(*_grid_mesh(1))
+    t = time()
+    m.improve_quality(min_angle=30., max_area=max_area)
+    return len(m.elements), time() - t
+
+def bench_locate(n=300, points=10**6):
+    """
+    Locates random points in a mesh with 2*n*n elements, returns the tuple
+    (number of points, time of the first call including the search
+    structure, time of the second call) in seconds.
+    """
+    from numpy.random import RandomState
+    from femhub.domain import Mesh
+    m = Mesh(*_grid_mesh(n))
+    m.use_arrays()
+    p = RandomState(0).rand(points, 2)
+    t = time()
+    m.locate(p)
+    t_first = time() - t
+    t = time()
+    m.locate(p)
+    return points, t_first, time() - t
+
+def bench_contains(n=5000, points=10**6):
+    """
+    Classifies random points against a star shaped domain with n boundary
+    edges, returns the tuple (number of points, time) in seconds.
+    """
+    from math import pi, sin, cos
+    from numpy.random import RandomState
+    from femhub.domain import Domain
+    nodes = []
+    for i in range(n):
+        t = 2*pi*i/n
+        r = 1 + 0.3*sin(7*t)
+        nodes.append([r*cos(t), r*sin(t)])
+    d = Domain(nodes, [[i, (i+1) % n] for i in range(n)])
+    p = RandomState(0).rand(points, 2)*3 - 1.5
+    t = time()
+    d.contains(p)
+    return points, time() - t
+
+def bench_plot(n=224, filename="/tmp/femhub_mesh.png"):
+    """
+    Plots a mesh with 2*n*n elements with all edges and by the level of
+    detail mode, returns the tuple (number of elements, time of the full
+    plot, time of the level of detail plot) in seconds.
+    """
+    from femhub.domain import Mesh
+    m = Mesh(*_grid_mesh(n))
+    m.use_arrays()
+    t = time()
+    m.plot(filename, max_elements=len(m.elements))
+    t_full = time() - t
+    t = time()
+    m.plot(filename, max_elements=0)
+    return len(m.elements), t_full, time() - t
+
+def bench_render(n=100, frames=50, filename="/tmp/femhub_frame.png"):
+    """
+    Renders a time series of solutions on a mesh with 2*n*n elements by the
+    numpy backend of plot.Renderer, returns the tuple (number of frames,
+    setup time, time per frame) in seconds.
+    """
+    from numpy import sin, cos
+    from femhub.domain import Mesh
+    from femhub.plot import Renderer
+    m = Mesh(*_grid_mesh(n))
+    m.use_arrays()
+    x = m.node_array
+    t = time()
+    r = Renderer(m, backend="numpy")
+    t_setup = time() - t
+    t = time()
+    for k in range(frames):
+        r.render(sin(3*x[:, 0] + 0.1*k)*cos(2*x[:, 1]), filename, -1, 1)
+    return frames, t_setup, (time() - t)/frames
+
+def bench_mesh_xml(n=708, filename="/tmp/femhub_mesh.xml"):
+    """
+    Writes a mesh with 2*n*n elements (10^6 by default) to the mesh editor
+    XML file and reads it back, returns the tuple (number of elements, write
+    time, read time) in seconds.
+    """
+    from femhub.domain import Mesh
+    from femhub.mesh_xml import write_mesh_xml, read_mesh_xml
+    m = Mesh(*_grid_mesh(n))
+    t = time()
+    f = open(filename, "w")
+    try:
+        write_mesh_xml(f, m.nodes, m.elements, m.boundaries)
+    finally:
+        f.close()
+    t_write = time() - t
+    t = time()
+    m2 = read_mesh_xml(filename)
+    t_read = time() - t
+    assert m2.elements == [tuple(e) for e in m.elements]
+    return len(m.elements), t_write, t_read
+
+def bench_import():
+    """
+    Imports femhub in a new Python process, returns the import time in
+    seconds (the process startup is not included).
+    """
+    import os, subprocess, sys
+    import femhub
+    root = os.path.dirname(os.path.dirname(os.path.abspath(femhub.__file__)))
+    code = "import sys, time; sys.path.insert(0, %r); t = time.time(); import femhub; print time.time() - t" % root
+    return float(subprocess.check_output([sys.executable, "-c", code]))
+
+def run():
+    print "import femhub: %.3fs" % bench_import()
+    for n in [10000, 20000]:
+        t_list, t_hashed = bench_front(n)
+        print "front with %d edges: list %.3fs, Front %.3fs (%.0fx)" % (n,
+                t_list, t_hashed, t_list/t_hashed)
+    t_loop, t_grid = bench_edges_intersect()
+    print "edge intersections: pairwise %.3fs, grid %.3fs" % (t_loop, t_grid)
+    for n in [100, 300]:
+        r = bench_mesh_storage(n)
+        print "mesh with %d elements: lists %.1f MB %.3fs, arrays %.1f MB %.3fs" % \
+                (2*n*n, r["list memory"]/1e6, r["list time"],
+                r["array memory"]/1e6, r["array time"])
+    n, t = bench_refine_uniform()
+    print "uniform refinement to %d elements: %.3fs" % (n, t)
+    n, t = bench_improve_quality()
+    print "quality refinement to %d elements: %.3fs" % (n, t)
+    n, t_first, t = bench_locate()
+    print "locating %d points: %.3fs (with setup %.3fs), %.2f us per point" % \
+            (n, t, t_first, t/n*1e6)
+    n, t = bench_contains()
+    print "classifying %d points against a domain: %.3fs" % (n, t)
+    n, t_full, t_lod = bench_plot()
+    print "plotting %d elements: all edges %.3fs, level of detail %.3fs" % \
+            (n, t_full, t_lod)
+    n, t_setup, t = bench_render()
+    print "rendering %d frames: setup %.3fs, %.3fs per frame" % \
+            (n, t_setup, t)
+    n, t_write, t_read = bench_mesh_xml()
+    print "mesh XML with %d elements: write %.3fs, read %.3fs" % \
+            (n, t_write, t_read)
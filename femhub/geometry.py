@@ -0,0 +1,230 @@
+"""
+Batch geometry of mesh elements.
+
+All functions take the nodes as an array (or a list) of the shape (N, 2) and
+the elements as an array (or a list) of the shape (M, k) with k = 3 for
+triangles and k = 4 for quads, and compute the given quantity for all
+elements at once.
+
+The edges of an element (a, b, c) are ordered (a, b), (b, c), (c, a), i.e.
+the edge i goes from the vertex i to the vertex i+1.
+"""
+
+from numpy import asarray, sqrt, arctan2, abs, roll, empty, degrees, \
+        histogram, zeros, nan, errstate, isnan, isfinite, clip
+
+def element_coordinates(nodes, elements):
+    """
+    Returns the array of the shape (M, k, 2) with the coordinates of the
+    vertices of all elements.
+
+    Example:
+
+    >>> element_coordinates([[0, 0], [1, 0], [0, 1]], [[0, 1, 2]]).tolist()
+    [[[0, 0], [1, 0], [0, 1]]]
+
+    """
+    nodes = asarray(nodes)
+    elements = asarray(elements, dtype="int32")
+    if len(elements) == 0:
+        return empty((0, 3, 2), dtype=nodes.dtype)
+    return nodes[elements]
+
+def edge_vectors(xy):
+    """
+    Returns the array of the shape (M, k, 2) with the edge vectors of the
+    elements, given their vertex coordinates "xy" (see
+    element_coordinates()).
+    """
+    return roll(xy, -1, axis=1) - xy
+
+def _lengths(d):
+    return sqrt(d[:, :, 0]**2 + d[:, :, 1]**2)
+
+def _determinants(xy):
+    ab = xy[:, 1] - xy[:, 0]
+    ac = xy[:, 2] - xy[:, 0]
+    return ab[:, 0]*ac[:, 1] - ab[:, 1]*ac[:, 0]
+
+def _areas(xy):
+    x = xy[:, :, 0]
+    y = xy[:, :, 1]
+    return ((x*roll(y, -1, axis=1)).sum(axis=1) -
+            (roll(x, -1, axis=1)*y).sum(axis=1))/2.
+
+def _angles(d):
+    # at the vertex i, the edge i leaves and the edge i-1 comes in
+    u = d
+    v = -roll(d, 1, axis=1)
+    cross = u[:, :, 0]*v[:, :, 1] - u[:, :, 1]*v[:, :, 0]
+    dot = u[:, :, 0]*v[:, :, 0] + u[:, :, 1]*v[:, :, 1]
+    return arctan2(abs(cross), dot)
+
+def edge_lengths(nodes, elements):
+    """
+    Returns the array of the shape (M, k) with the edge lengths of all
+    elements.
+
+    Example:
+
+    >>> edge_lengths([[0., 0.], [3., 0.], [0., 4.]], [[0, 1, 2]]).tolist()
+    [[3.0, 5.0, 4.0]]
+
+    """
+    return _lengths(edge_vectors(element_coordinates(nodes, elements)))
+
+def orientation_determinants(nodes, elements):
+    """
+    Returns the array of the cross products (b - a) x (c - a) of the first
+    three vertices (a, b, c) of all elements.
+
+    The value is positive for positively (counterclockwise) oriented
+    elements and equal to twice the area for triangles.
+    """
+    return _determinants(element_coordinates(nodes, elements))
+
+def signed_areas(nodes, elements):
+    """
+    Returns the array of the signed areas of all elements (positive for
+    counterclockwise elements).
+
+    Example:
+
+    >>> signed_areas([[0., 0.], [1., 0.], [1., 1.], [0., 1.]], [[0, 1, 2], [0, 2, 1]]).tolist()
+    [0.5, -0.5]
+    >>> signed_areas([[0., 0.], [1., 0.], [1., 1.], [0., 1.]], [[0, 1, 2, 3]]).tolist()
+    [1.0]
+
+    """
+    return _areas(element_coordinates(nodes, elements))
+
+def angles(nodes, elements):
+    """
+    Returns the array of the shape (M, k) with the angles (in radians) of
+    all elements at their vertices.
+
+    Example:
+
+    >>> from numpy import degrees
+    >>> degrees(angles([[0., 0.], [1., 0.], [0., 1.]], [[0, 1, 2]])).round(6).tolist()
+    [[90.0, 45.0, 45.0]]
+
+    """
+    return _angles(edge_vectors(element_coordinates(nodes, elements)))
+
+def element_geometry(nodes, elements):
+    """
+    Computes the geometry of all elements in one pass.
+
+    Returns a dictionary with the keys "edge_lengths", "areas" (signed),
+    "angles" and "positive" (True for positively oriented elements), see
+    the functions above.
+
+    Example:
+
+    >>> g = element_geometry([[0., 0.], [1., 0.], [0., 1.]], [[0, 1, 2], [0, 2, 1]])
+    >>> g["positive"].tolist()
+    [True, False]
+    >>> g["areas"].tolist()
+    [0.5, -0.5]
+
+    """
+    xy = element_coordinates(nodes, elements)
+    d = edge_vectors(xy)
+    return {
+            "edge_lengths": _lengths(d),
+            "areas": _areas(xy),
+            "angles": _angles(d),
+            "positive": _determinants(xy) > 0,
+            }
+
+def element_quality(nodes, elements, geometry=None):
+    """
+    Computes the quality measures of all elements.
+
+    Returns a dictionary of arrays (one value per element) with the keys
+    "min_angle" and "max_angle" (in degrees), "aspect_ratio" (the longest
+    edge over the shortest edge), "radius_ratio" (twice the inradius over
+    the circumradius, 1 for the equilateral triangle and 0 for a degenerate
+    one, NaN for quads) and "area" (signed). The result of
+    element_geometry() can be passed as "geometry" to save its computation.
+
+    Example:
+
+    >>> q = element_quality([[0., 0.], [1., 0.], [0.5, 3**0.5/2], [0., 1.]], [[0, 1, 2], [0, 1, 3]])
+    >>> q["min_angle"].round(6).tolist(), q["max_angle"].round(6).tolist()
+    ([60.0, 45.0], [60.0, 90.0])
+    >>> q["radius_ratio"].round(6).tolist()
+    [1.0, 0.828427]
+
+    """
+    if geometry is None:
+        geometry = element_geometry(nodes, elements)
+    lengths = geometry["edge_lengths"]
+    areas = geometry["areas"]
+    a = degrees(geometry["angles"])
+    m = len(areas)
+    if m == 0:
+        empty_values = zeros(0)
+        return {"min_angle": empty_values, "max_angle": empty_values,
+                "aspect_ratio": empty_values, "radius_ratio": empty_values,
+                "area": empty_values}
+    longest = lengths.max(axis=1)
+    shortest = lengths.min(axis=1)
+    with errstate(divide="ignore", invalid="ignore"):
+        aspect = longest/shortest
+        if lengths.shape[1] == 3:
+            # r = 2A/P and R = abc/(4A)
+            radius = 16*areas**2/(lengths.sum(axis=1)*lengths.prod(axis=1))
+        else:
+            radius = zeros(m) + nan
+    return {
+            "min_angle": a.min(axis=1),
+            "max_angle": a.max(axis=1),
+            "aspect_ratio": aspect,
+            "radius_ratio": radius,
+            "area": areas,
+            }
+
+def quality_histograms(quality, bins=10):
+    """
+    Returns the histograms of the quality measures returned by
+    element_quality(): a dictionary with the same keys and the values
+    (counts, edges) as returned by numpy.histogram().
+
+    The angles are binned over [0, 180] degrees and the radius ratio over
+    [0, 1], the other measures over the range of their finite values. The
+    NaN values are left out and the infinite ones (e.g. the aspect ratio of
+    an element with a zero length edge) are counted in the first or the
+    last bin.
+
+    Example:
+
+    >>> q = element_quality([[0., 0.], [1., 0.], [0., 1.]], [[0, 1, 2]])
+    >>> quality_histograms(q, bins=4)["min_angle"][0].tolist()
+    [0, 1, 0, 0]
+    >>> q = element_quality([[0., 0.], [1., 0.], [0., 1.], [1., 0.]], [[0, 1, 2], [0, 1, 3]])
+    >>> q["aspect_ratio"].tolist()
+    [1.4142135623730951, inf]
+    >>> quality_histograms(q, bins=4)["aspect_ratio"][0].tolist()
+    [0, 0, 1, 1]
+
+    """
+    ranges = {"min_angle": (0, 180), "max_angle": (0, 180),
+            "radius_ratio": (0, 1)}
+    result = {}
+    for key, values in quality.items():
+        values = values[~isnan(values)]
+        r = ranges.get(key)
+        if r is None:
+            finite = values[isfinite(values)]
+            if len(finite) == 0:
+                r = (0, 1)
+            elif finite.min() == finite.max():
+                # as numpy.histogram() does for a single value
+                r = (finite.min() - 0.5, finite.max() + 0.5)
+            else:
+                r = (finite.min(), finite.max())
+        values = clip(values, r[0], r[1])
+        result[key] = histogram(values, bins=bins, range=r)
+    return result
@@ -0,0 +1,295 @@
+"""
+Point location in a triangular mesh and in a polygonal domain.
+
+The PointLocator class finds the elements containing many points at once
+(stored in NumPy arrays, see refinement.py). The elements are bucketed into
+the cells of a uniform grid by their bounding boxes. Each point starts in
+the first element of its cell and walks towards the point across the
+element edges (using the neighbours from topology.Topology), all points
+together. The few points that leave the mesh or do not arrive in a few
+steps test all elements of their cell.
+
+The function points_in_loops() classifies points against the boundary
+loops of a domain by the crossing number test.
+"""
+
+from numpy import asarray, zeros, empty, arange, argsort, bincount, \
+        concatenate, cumsum, floor, repeat, sqrt, nan, minimum, maximum, \
+        argmin, ones
+
+from topology import Topology
+
+def barycentric(nodes, elements, points, tol=1e-12):
+    """
+    Returns the barycentric coordinates (an array of the shape (N, 3)) of
+    the points "points" in the triangles "elements" (one triangle per
+    point).
+
+    Example:
+
+    >>> barycentric([[0., 0.], [1., 0.], [0., 1.]], [[0, 1, 2]], [[0.25, 0.5]]).tolist()
+    [[0.25, 0.25, 0.5]]
+
+    """
+    nodes = asarray(nodes, dtype="float64")
+    elements = asarray(elements)
+    points = asarray(points, dtype="float64")
+    a = nodes[elements[:, 0]]
+    b = nodes[elements[:, 1]]
+    c = nodes[elements[:, 2]]
+    det = (b[:, 0] - a[:, 0])*(c[:, 1] - a[:, 1]) - \
+            (b[:, 1] - a[:, 1])*(c[:, 0] - a[:, 0])
+    det[det == 0] = nan
+    l1 = ((c[:, 0] - points[:, 0])*(a[:, 1] - points[:, 1]) -
+            (c[:, 1] - points[:, 1])*(a[:, 0] - points[:, 0]))/det
+    l2 = ((a[:, 0] - points[:, 0])*(b[:, 1] - points[:, 1]) -
+            (a[:, 1] - points[:, 1])*(b[:, 0] - points[:, 0]))/det
+    result = empty((len(points), 3))
+    result[:, 0] = 1 - l1 - l2
+    result[:, 1] = l1
+    result[:, 2] = l2
+    return result
+
+class PointLocator:
+    """
+    Locates points in the triangular mesh given by "nodes" and "elements".
+
+    The "topology" (a topology.Topology of the mesh) is computed if not
+    given.
+
+    Example:
+
+    >>> nodes = [[0., 0.], [1., 0.], [1., 1.], [0., 1.]]
+    >>> loc = PointLocator(nodes, [[0, 1, 2], [0, 2, 3]])
+    >>> elements, bary = loc.locate([[0.75, 0.25], [0.25, 0.5], [2., 2.]])
+    >>> elements.tolist()
+    [0, 1, -1]
+    >>> bary[:2].tolist()
+    [[0.25, 0.5, 0.25], [0.5, 0.25, 0.25]]
+
+    """
+
+    def __init__(self, nodes, elements, topology=None, max_steps=16):
+        self.nodes = asarray(nodes, dtype="float64")
+        self.elements = asarray(elements, dtype="int32")
+        if len(self.elements) > 0 and self.elements.shape[1] != 3:
+            raise ValueError("Only triangles can be located.")
+        if topology is None:
+            topology = Topology(len(self.nodes), self.elements)
+        self.neighbours = topology.neighbours
+        self.max_steps = max_steps
+        self._build_grid()
+
+    def _build_grid(self):
+        """
+        Buckets the elements into the grid cells overlapped by their
+        bounding boxes, in the compressed sparse row format.
+        """
+        m = len(self.elements)
+        if m == 0:
+            self.lo = zeros(2)
+            self.h = 1.
+            self.nx = self.ny = 1
+            self.cell_indptr = zeros(2, dtype="int64")
+            self.cell_elements = zeros(0, dtype="int32")
+            return
+        xy = self.nodes[self.elements]
+        lo = xy.min(axis=1)
+        hi = xy.max(axis=1)
+        self.lo = lo.min(axis=0)
+        size = hi.max(axis=0) - self.lo
+        h = sqrt(size[0]*size[1]/m)
+        if not h > 0:
+            h = max(size.max()/m, 1e-300)
+        self.h = h
+        self.nx = int(size[0]/h) + 1
+        self.ny = int(size[1]/h) + 1
+        i0 = self._cells(lo[:, 0], 0)
+        i1 = self._cells(hi[:, 0], 0)
+        j0 = self._cells(lo[:, 1], 1)
+        j1 = self._cells(hi[:, 1], 1)
+        wx = i1 - i0 + 1
+        wy = j1 - j0 + 1
+        count = wx*wy
+        # all cells (i, j) of each element's box
+        t = repeat(arange(m), count)
+        start = concatenate([[0], cumsum(count)[:-1]])
+        k = arange(count.sum()) - repeat(start, count)
+        i = i0[t] + k % wx[t]
+        j = j0[t] + k // wx[t]
+        cell = j*self.nx + i
+        order = argsort(cell, kind="mergesort")
+        self.cell_elements = t[order].astype("int32")
+        self.cell_indptr = concatenate([[0],
+            cumsum(bincount(cell, minlength=self.nx*self.ny))])
+
+    def _cells(self, x, axis):
+        n = self.nx if axis == 0 else self.ny
+        c = floor((x - self.lo[axis])/self.h).astype("int64")
+        return minimum(maximum(c, 0), n - 1)
+
+    def locate(self, points, tol=1e-12):
+        """
+        Returns the tuple (elements, bary): the index of the element
+        containing each point (or -1 if the point is outside of the mesh)
+        and the barycentric coordinates of the point in it (NaN for the
+        points outside).
+
+        A point on an edge shared by two elements is located in one of
+        them. Points within "tol" (relative to the barycentric coordinates)
+        outside of an element are counted as inside.
+        """
+        points = asarray(points, dtype="float64").reshape((-1, 2))
+        n = len(points)
+        found = zeros(n, dtype="int64") - 1
+        bary = empty((n, 3))
+        bary[:] = nan
+        if n == 0 or len(self.elements) == 0:
+            return found, bary
+        fx = floor((points[:, 0] - self.lo[0])/self.h)
+        fy = floor((points[:, 1] - self.lo[1])/self.h)
+        inside_grid = (fx >= 0) & (fx < self.nx) & (fy >= 0) & (fy < self.ny)
+        cell = zeros(n, dtype="int64") - 1
+        cell[inside_grid] = (fy[inside_grid]*self.nx +
+                fx[inside_grid]).astype("int64")
+        count = zeros(n, dtype="int64")
+        count[inside_grid] = self.cell_indptr[cell[inside_grid] + 1] - \
+                self.cell_indptr[cell[inside_grid]]
+        active = (count > 0).nonzero()[0]
+        # walk from the first element of the cell
+        t = self.cell_elements[self.cell_indptr[cell[active]]].astype("int64")
+        pending = []
+        for step in range(self.max_steps):
+            if len(active) == 0:
+                break
+            lam = barycentric(self.nodes, self.elements[t], points[active])
+            worst = argmin(lam, axis=1)
+            low = lam[arange(len(active)), worst]
+            done = low >= -tol
+            found[active[done]] = t[done]
+            bary[active[done]] = lam[done]
+            go = ~done
+            active = active[go]
+            t = self.neighbours[t[go], (worst[go] + 1) % 3]
+            lost = t < 0
+            pending.append(active[lost])
+            active = active[~lost]
+            t = t[~lost]
+        pending.append(active)
+        rest = concatenate(pending)
+        if len(rest) > 0:
+            self._scan(points, rest, cell, count, found, bary, tol)
+        return found, bary
+
+    def _scan(self, points, index, cell, count, found, bary, tol):
+        """
+        Tests all elements of the cells of the points "index".
+        """
+        c = count[index]
+        p = repeat(index, c)
+        start = repeat(self.cell_indptr[cell[index]], c)
+        offset = arange(c.sum()) - repeat(concatenate([[0],
+            cumsum(c)[:-1]]), c)
+        t = self.cell_elements[start + offset]
+        lam = barycentric(self.nodes, self.elements[t], points[p])
+        ok = lam.min(axis=1) >= -tol
+        # the first hit of each point
+        p = p[ok]
+        t = t[ok]
+        lam = lam[ok]
+        first = ones(len(p), dtype="bool")
+        first[1:] = p[1:] != p[:-1]
+        found[p[first]] = t[first]
+        bary[p[first]] = lam[first]
+
+def points_in_loops(points, nodes, edges, max_block=1 << 18):
+    """
+    Returns a boolean array, True for the points inside the domain bounded
+    by the closed loops of "edges" (pairs of indices into "nodes", the
+    orientation does not matter, holes are loops inside other loops).
+
+    A point is inside if a ray from it crosses the edges an odd number of
+    times. The points on an edge are outside (as in
+    triangulation.lies_inside()). The edges are bucketed into horizontal
+    bands, so each point is only tested against the edges that span its
+    band; at most "max_block" point-edge pairs are tested at once.
+
+    Example:
+
+    >>> nodes = [[0, 0], [1, 0], [1, 1], [0, 1], [0.25, 0.25], [0.75, 0.25], [0.75, 0.75], [0.25, 0.75]]
+    >>> edges = [(0, 1), (1, 2), (2, 3), (3, 0), (4, 7), (7, 6), (6, 5), (5, 4)]
+    >>> points_in_loops([[0.5, 0.5], [0.125, 0.5], [0., 0.5], [1., 0.5], [2., 0.5]], nodes, edges).tolist()
+    [False, True, False, False, False]
+
+    """
+    points = asarray(points, dtype="float64").reshape((-1, 2))
+    nodes = asarray(nodes, dtype="float64")
+    edges = asarray(edges, dtype="int64").reshape((-1, 2))
+    n = len(points)
+    result = zeros(n, dtype="bool")
+    if n == 0 or len(edges) == 0:
+        return result
+    x1 = nodes[edges[:, 0], 0]
+    y1 = nodes[edges[:, 0], 1]
+    x2 = nodes[edges[:, 1], 0]
+    y2 = nodes[edges[:, 1], 1]
+    y_lo = minimum(y1, y2)
+    y_hi = maximum(y1, y2)
+    bottom = y_lo.min()
+    top = y_hi.max()
+    bands = max(1, min(len(edges)//4, 4096))
+    h = (top - bottom)/bands
+    if not h > 0:
+        h = 1.
+    def band(y):
+        return minimum(maximum(floor((y - bottom)/h), 0),
+                bands - 1).astype("int64")
+    b0 = band(y_lo)
+    b1 = band(y_hi)
+    count = b1 - b0 + 1
+    e = repeat(arange(len(edges)), count)
+    start = concatenate([[0], cumsum(count)[:-1]])
+    b = b0[e] + arange(count.sum()) - repeat(start, count)
+    order = argsort(b, kind="mergesort")
+    band_edges = e[order]
+    band_indptr = concatenate([[0], cumsum(bincount(b, minlength=bands))])
+    px = points[:, 0]
+    py = points[:, 1]
+    candidates = ((py >= bottom) & (py <= top)).nonzero()[0]
+    pb = band(py[candidates])
+    order = argsort(pb)
+    candidates = candidates[order]
+    pb = pb[order]
+    point_indptr = concatenate([[0], cumsum(bincount(pb, minlength=bands))])
+    for k in range(bands):
+        be = band_edges[band_indptr[k]:band_indptr[k+1]]
+        pts = candidates[point_indptr[k]:point_indptr[k+1]]
+        if len(be) == 0 or len(pts) == 0:
+            continue
+        ax = x1[be]
+        ay = y1[be]
+        dx = x2[be] - ax
+        dy = y2[be] - ay
+        up = dy > 0
+        step = max(1, max_block // len(be))
+        for i in range(0, len(pts), step):
+            p = pts[i:i+step]
+            X = px[p][:, None] - ax
+            Y = py[p][:, None] - ay
+            cross = dx*Y - dy*X
+            # the edge spans the horizontal line through the point (half
+            # open, so that a vertex is counted once) and the crossing is to
+            # the right of the point: cross has the sign of dy
+            spans = (Y < 0) != (Y < dy)
+            crossings = (spans & ((cross > 0) == up)).sum(axis=1)
+            inside = crossings % 2 == 1
+            i, j = (cross == 0).nonzero()
+            if len(i) > 0:
+                # the points on an edge: within the bounding box of the edge
+                x = X[i, j]
+                y = Y[i, j]
+                on_edge = (minimum(dx[j], 0) <= x) & (x <= maximum(dx[j], 0)) \
+                        & (minimum(dy[j], 0) <= y) & (y <= maximum(dy[j], 0))
+                inside[i[on_edge]] = False
+            result[p] = inside
+    return result
@@ -0,0 +1,193 @@
+"""
+The mesh editor XML format.
+
+The document (without any whitespace) is:
+
+<?xml version='1.0' encoding='UTF-8'?><mesheditor>
+<vertices><vertex id='0'><x>0.0</x><y>0.0</y></vertex>...</vertices>
+<elements><element id='0'><v1>0</v1><v2>1</v2><v3>2</v3>
+<material>0</material></element>...</elements>
+<boundaries><boundary id='0'><v1>0</v1><v2>1</v2><marker>1</marker>
+<angle>0</angle></boundary>...</boundaries></mesheditor>
+
+write_mesh_xml() writes it to a file-like object in batches, so only a batch
+of the document is in memory at a time, and read_mesh_xml() parses it
+incrementally (in chunks, without building the element tree) back into a
+Mesh.
+"""
+
+from xml.sax.saxutils import escape
+
+def _text(v):
+    return escape(str(v))
+
+def _rows(a):
+    """
+    Returns the rows of "a" (a list or a NumPy array) as lists of Python
+    numbers, so that they are formatted as in a list-backed mesh.
+    """
+    if hasattr(a, "tolist"):
+        return a.tolist()
+    return a
+
+def write_mesh_xml(f, nodes, elements, boundaries, curves=[], batch=10000,
+        float_format=repr):
+    """
+    Writes the mesh to the file-like object "f" (anything with the write()
+    method).
+
+    The boundaries are rows [a, b, marker] or [a, b, marker, angle]; the
+    angle of the rows without it is taken from the "curves" (rows [a, b,
+    angle]), or 0. The document is written in batches of "batch" items.
+    The coordinates are formatted by "float_format", repr() keeps all the
+    digits, so that read_mesh_xml() gives back the same nodes.
+
+    Example:
+
+    >>> import sys
+    >>> write_mesh_xml(sys.stdout, [[0, 0], [1, 0], [0, 1]], [[0, 1, 2]], [[0, 1, 1], [1, 2, 2], [2, 0, 3]], [[1, 2, 90]])
+    <?xml version='1.0' encoding='UTF-8'?><mesheditor><vertices><vertex id='0'><x>0</x><y>0</y></vertex><vertex id='1'><x>1</x><y>0</y></vertex><vertex id='2'><x>0</x><y>1</y></vertex></vertices><elements><element id='0'><v1>0</v1><v2>1</v2><v3>2</v3><material>0</material></element></elements><boundaries><boundary id='0'><v1>0</v1><v2>1</v2><marker>1</marker><angle>0</angle></boundary><boundary id='1'><v1>1</v1><v2>2</v2><marker>2</marker><angle>90</angle></boundary><boundary id='2'><v1>2</v1><v2>0</v2><marker>3</marker><angle>0</angle></boundary></boundaries></mesheditor>
+
+    """
+    angles = dict(((c[0], c[1]), c[2]) for c in _rows(curves))
+    f.write("<?xml version='1.0' encoding='UTF-8'?>")
+    f.write("<mesheditor>")
+
+    f.write("<vertices>")
+    for start in range(0, len(nodes), batch):
+        f.write("".join(["<vertex id='%d'><x>%s</x><y>%s</y></vertex>" %
+            (start + i, float_format(n[0]), float_format(n[1]))
+            for i, n in enumerate(_rows(nodes[start:start+batch]))]))
+    f.write("</vertices>")
+
+    f.write("<elements>")
+    for start in range(0, len(elements), batch):
+        s = []
+        for i, e in enumerate(_rows(elements[start:start+batch])):
+            s.append("<element id='%d'>" % (start + i))
+            for j, v in enumerate(e):
+                s.append("<v%d>%s</v%d>" % (j + 1, v, j + 1))
+            s.append("<material>0</material></element>")
+        f.write("".join(s))
+    f.write("</elements>")
+
+    f.write("<boundaries>")
+    for start in range(0, len(boundaries), batch):
+        s = []
+        for i, b in enumerate(_rows(boundaries[start:start+batch])):
+            if len(b) > 3:
+                angle = b[3]
+            else:
+                angle = angles.get((b[0], b[1]), 0)
+            s.append("<boundary id='%d'><v1>%s</v1><v2>%s</v2>"
+                    "<marker>%s</marker><angle>%s</angle></boundary>" %
+                    (start + i, b[0], b[1], _text(b[2]), _text(angle)))
+        f.write("".join(s))
+    f.write("</boundaries>")
+
+    f.write("</mesheditor>")
+
+def _number(s):
+    try:
+        return int(s)
+    except ValueError:
+        return float(s)
+
+class _MeshTarget:
+    """
+    The parser target of read_mesh_xml(): collects the text of the leaf
+    elements into the row of the current vertex, element or boundary, no
+    tree is built.
+    """
+
+    def __init__(self):
+        self.nodes = []
+        self.elements = []
+        self.boundaries = []
+        self.curves = []
+        self.row = []
+        self.angle = 0
+        self.text = []
+
+    def start(self, tag, attrib):
+        self.text = []
+
+    def data(self, data):
+        self.text.append(data)
+
+    def end(self, tag):
+        if tag in _INDICES:
+            self.row.append(int("".join(self.text)))
+        elif tag == "x" or tag == "y":
+            self.row.append(float("".join(self.text)))
+        elif tag == "marker":
+            self.row.append(_number("".join(self.text)))
+        elif tag == "angle":
+            self.angle = _number("".join(self.text))
+        elif tag == "vertex":
+            self.nodes.append(self.row)
+            self.row = []
+        elif tag == "element":
+            self.elements.append(tuple(self.row))
+            self.row = []
+        elif tag == "boundary":
+            self.boundaries.append(self.row)
+            if self.angle != 0:
+                self.curves.append([self.row[0], self.row[1], self.angle])
+            self.row = []
+            self.angle = 0
+
+    def close(self):
+        pass
+
+_INDICES = frozenset(["v1", "v2", "v3", "v4"])
+
+def read_mesh_xml(source, chunk_size=1 << 16):
+    """
+    Reads the mesh written by write_mesh_xml() from "source" (a file name or
+    a file-like object) and returns it as a Mesh.
+
+    The document is fed to the parser in chunks of "chunk_size" bytes and
+    only the mesh itself is kept in memory (no element tree is built). The
+    boundaries with a nonzero angle are also returned as the curves [a, b,
+    angle].
+
+    Example:
+
+    >>> from StringIO import StringIO
+    >>> f = StringIO()
+    >>> write_mesh_xml(f, [[0.0, 0.0], [1.0, 0.0], [0.0, 1.0]], [[0, 1, 2]], [[0, 1, 1, 0], [1, 2, 2, 90], [2, 0, 3, 0]])
+    >>> f.seek(0)
+    >>> m = read_mesh_xml(f)
+    >>> m.nodes, m.elements, m.boundaries, m.curves
+    ([[0.0, 0.0], [1.0, 0.0], [0.0, 1.0]], [(0, 1, 2)], [[0, 1, 1], [1, 2, 2], [2, 0, 3]], [[1, 2, 90]])
+    >>> f = StringIO()
+    >>> write_mesh_xml(f, [[0.1 + 0.2, 0.0], [1.0, 1/3.], [0.0, 1.0]], [[0, 1, 2]], [])
+    >>> f.seek(0)
+    >>> read_mesh_xml(f).nodes == [[0.1 + 0.2, 0.0], [1.0, 1/3.], [0.0, 1.0]]
+    True
+
+    """
+    try:
+        from xml.etree.cElementTree import XMLParser
+    except ImportError:
+        from xml.etree.ElementTree import XMLParser
+    from domain import Mesh
+    if isinstance(source, basestring):
+        f = open(source, "rb")
+    else:
+        f = source
+    target = _MeshTarget()
+    parser = XMLParser(target=target)
+    try:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            parser.feed(data)
+        parser.close()
+    finally:
+        if f is not source:
+            f.close()
+    return Mesh(target.nodes, target.elements, target.boundaries,
+            target.curves)
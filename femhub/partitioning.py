@@ -0,0 +1,129 @@
+"""
+Mesh partitioning.
+
+The elements of a mesh (stored in NumPy arrays, see refinement.py) are split
+into parts of about the same size by recursive bisection of their centroids,
+and each part can be extracted as a submesh with the maps of its local nodes
+and elements to the global ones.
+"""
+
+from numpy import asarray, zeros, empty, arange, argsort, unique, bincount, \
+        in1d, cov, argmax, abs
+from numpy.linalg import eigh
+
+from refinement import edge_keys
+
+def _direction(points, method):
+    """
+    Returns the direction along which the points are split: the axis of the
+    largest extent ("coordinate") or the principal axis of inertia
+    ("inertial").
+    """
+    if method == "coordinate":
+        d = zeros(2)
+        d[argmax(points.max(axis=0) - points.min(axis=0))] = 1.
+        return d
+    if method == "inertial":
+        if len(points) < 2:
+            return asarray([1., 0.])
+        values, vectors = eigh(cov(points.T))
+        d = vectors[:, argmax(values)]
+        # the sign of an eigenvector is arbitrary, fix it
+        if d[argmax(abs(d))] < 0:
+            d = -d
+        return d
+    raise ValueError("Unknown partitioning method: %s" % method)
+
+def recursive_bisection(points, k, method="inertial"):
+    """
+    Splits the points into "k" parts and returns the array of their part
+    numbers.
+
+    The points are sorted along the direction given by the "method" (see
+    _direction()) and split so that the sizes of the two halves are in the
+    ratio of the numbers of parts they are split into next, recursively.
+    The part sizes differ by at most one.
+
+    Example:
+
+    >>> recursive_bisection([[0, 0], [3, 0], [1, 0], [2, 0], [4, 0], [5, 0]], 3, "coordinate").tolist()
+    [0, 1, 0, 1, 2, 2]
+
+    """
+    points = asarray(points, dtype="float64")
+    if k < 1:
+        raise ValueError("The number of parts must be positive.")
+    parts = zeros(len(points), dtype="int32")
+    stack = [(arange(len(points)), k, 0)]
+    while stack:
+        index, k, first = stack.pop()
+        if k == 1 or len(index) == 0:
+            parts[index] = first
+            continue
+        k1 = k // 2
+        p = points[index]
+        projection = p.dot(_direction(p, method))
+        order = argsort(projection, kind="mergesort")
+        n1 = (len(index)*k1 + k//2) // k
+        stack.append((index[order[n1:]], k - k1, first + k1))
+        stack.append((index[order[:n1]], k1, first))
+    return parts
+
+def interface_nodes(elements, parts):
+    """
+    Returns the sorted array of the nodes shared by elements of more than one
+    part.
+
+    Example:
+
+    >>> interface_nodes([[0, 1, 2], [1, 3, 2], [3, 4, 2]], [0, 0, 1]).tolist()
+    [2, 3]
+
+    """
+    elements = asarray(elements, dtype="int64")
+    parts = asarray(parts, dtype="int64")
+    if len(elements) == 0:
+        return zeros(0, dtype="int64")
+    k = int(parts.max()) + 1
+    n = int(elements.max()) + 1
+    k_nodes = elements.shape[1]
+    pairs = unique(elements.ravel()*k + parts.repeat(k_nodes))
+    count = bincount(pairs // k, minlength=n)
+    return (count > 1).nonzero()[0]
+
+def submesh(nodes, elements, boundaries, selected):
+    """
+    Extracts the elements "selected" (an array of indices) as a new mesh.
+
+    Returns the tuple (nodes, elements, boundaries, node_map): the nodes of
+    the submesh, its elements and boundary edges in the local numbering,
+    and node_map, the global index of each local node. The boundaries are
+    the given boundary edges that are edges of the selected elements.
+
+    Example:
+
+    >>> n, e, b, node_map = submesh([[0., 0.], [1., 0.], [1., 1.], [0., 1.]], [[0, 1, 2], [0, 2, 3]], [[0, 1, 1], [1, 2, 2], [2, 3, 3], [3, 0, 4]], [1])
+    >>> e.tolist(), b.tolist(), node_map.tolist()
+    ([[0, 1, 2]], [[1, 2, 3], [2, 0, 4]], [0, 2, 3])
+
+    """
+    nodes = asarray(nodes, dtype="float64")
+    elements = asarray(elements, dtype="int32")
+    boundaries = asarray(boundaries, dtype="int32")
+    n = len(nodes)
+    selected = asarray(selected, dtype="int64")
+    elems = elements[selected]
+    node_map = unique(elems)
+    local = empty(n, dtype="int32")
+    local[node_map] = arange(len(node_map))
+    if len(boundaries) > 0 and len(elems) > 0:
+        k = elems.shape[1]
+        a = elems.ravel()
+        b = elems[:, list(range(1, k)) + [0]].ravel()
+        inside = in1d(edge_keys(boundaries[:, 0], boundaries[:, 1], n),
+                edge_keys(a, b, n))
+        bdy = boundaries[inside].copy()
+        bdy[:, :2] = local[bdy[:, :2]]
+    else:
+        bdy = zeros((0, 3), dtype="int32")
+    return nodes[node_map], local[elems], bdy, node_map
@@ -21,3 +21,278 @@ def plotsln(mesh, z=None, sln=None, colorbar=False, view=(0,0), filename="a.png"
     if view:
         mlab.view(view[0], view[1])
     mlab.savefig(filename)
+
+def mesh_edges(elements, n):
+    """
+    Returns the (E, 2) array of the unique edges (a, b), a < b, of the
+    elements (triangles or quads) of a mesh with "n" nodes, so that the edges
+    shared by two elements are drawn once.
+
+    Example:
+
+    >>> mesh_edges([[0, 1, 2], [0, 2, 3]], 4).tolist()
+    [[0, 1], [0, 2], [0, 3], [1, 2], [2, 3]]
+
+    """
+    from numpy import asarray, unique, column_stack
+    from refinement import edge_keys
+    elements = asarray(elements, dtype="int64")
+    if len(elements) == 0:
+        return elements.reshape((0, 2))
+    k = elements.shape[1]
+    keys = unique(edge_keys(elements.ravel(),
+        elements[:, list(range(1, k)) + [0]].ravel(), n))
+    return column_stack([keys // n, keys % n])
+
+def element_density(nodes, elements, resolution=512):
+    """
+    Returns the tuple (density, extent): the number of elements with the
+    centroid in each pixel of a raster over the bounding box of the nodes
+    (an array of the shape (rows, columns), the longer side has "resolution"
+    pixels, the row 0 at the bottom) and the extent (x0, x1, y0, y1) of the
+    raster.
+
+    Example:
+
+    >>> density, extent = element_density([[0, 0], [1, 0], [1, 1], [0, 1]], [[0, 1, 2], [0, 2, 3]], 2)
+    >>> density.tolist(), extent
+    ([[0, 1], [1, 0]], (0.0, 1.0, 0.0, 1.0))
+
+    """
+    from numpy import asarray, histogram2d
+    nodes = asarray(nodes, dtype="float64")
+    elements = asarray(elements, dtype="int64")
+    lo = nodes.min(axis=0)
+    hi = nodes.max(axis=0)
+    size = hi - lo
+    h = max(size.max(), 1e-300)/resolution
+    nx = max(1, int(round(size[0]/h)))
+    ny = max(1, int(round(size[1]/h)))
+    centroids = nodes[elements].mean(axis=1)
+    density, _, _ = histogram2d(centroids[:, 1], centroids[:, 0],
+            bins=[ny, nx], range=[[lo[1], hi[1]], [lo[0], hi[0]]])
+    return density.astype("int64"), (lo[0], hi[0], lo[1], hi[1])
+
+def plot_mesh(nodes, elements, filename="a.png", colors=None, edges=None,
+        boundaries=None, max_elements=50000, resolution=512):
+    """
+    Plots the mesh into the image "filename" using matplotlib (headless, by
+    the Agg backend).
+
+    All edges are drawn by one LineCollection, each edge once ("edges" are
+    the unique edges, see mesh_edges(), computed if not given). If "colors"
+    is given, the elements are filled by one PolyCollection: "colors" is
+    either a value per element (mapped by a colormap) or a list of
+    matplotlib colors.
+
+    Meshes with more than "max_elements" elements are too dense to be drawn
+    legibly, for them only the "boundaries" (an array of node pairs) and
+    the raster of the element density (see element_density(), at most
+    "resolution" pixels wide) are drawn.
+    """
+    from numpy import asarray, ma
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.collections import LineCollection, PolyCollection
+    nodes = asarray(nodes, dtype="float64")
+    elements = asarray(elements, dtype="int64")
+    fig = Figure(figsize=(8, 8))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    if len(elements) > max_elements:
+        # about 4 elements per pixel on average, so that the raster is smooth
+        resolution = max(1, min(resolution, int((len(elements)/4)**0.5)))
+        density, extent = element_density(nodes, elements, resolution)
+        ax.imshow(ma.masked_equal(density, 0), origin="lower", extent=extent,
+                cmap="Greys", vmin=0, interpolation="nearest")
+        if boundaries is None:
+            boundaries = []
+        boundaries = asarray(boundaries, dtype="int64").reshape((-1, 2))
+        ax.add_collection(LineCollection(nodes[boundaries], colors="k",
+            linewidths=1))
+    else:
+        if colors is not None:
+            polys = PolyCollection(nodes[elements], edgecolors="none")
+            c = asarray(colors)
+            if c.ndim == 1 and c.dtype.kind in "biuf":
+                polys.set_array(c.astype("float64"))
+                fig.colorbar(polys, ax=ax)
+            else:
+                polys.set_facecolors(colors)
+            ax.add_collection(polys)
+        if edges is None:
+            edges = mesh_edges(elements, len(nodes))
+        edges = asarray(edges, dtype="int64").reshape((-1, 2))
+        ax.add_collection(LineCollection(nodes[edges], colors="g",
+            linewidths=0.5))
+    if len(nodes) > 0:
+        lo = nodes.min(axis=0)
+        hi = nodes.max(axis=0)
+        ax.set_xlim(lo[0], hi[0])
+        ax.set_ylim(lo[1], hi[1])
+    ax.set_aspect("equal")
+    fig.savefig(filename)
+
+def _jet(n=256):
+    """
+    Returns the (n, 3) uint8 lookup table of the "jet" colormap (dark blue,
+    blue, cyan, yellow, red, dark red).
+    """
+    from numpy import linspace, interp, column_stack
+    x = linspace(0, 1, 6)
+    t = linspace(0, 1, n)
+    r = interp(t, x, [0, 0, 0, 1, 1, 0.5])
+    g = interp(t, x, [0, 0, 1, 1, 0, 0])
+    b = interp(t, x, [0.5, 1, 1, 0, 0, 0])
+    return (column_stack([r, g, b])*255 + 0.5).astype("uint8")
+
+def png_data(image, level=6):
+    """
+    Returns the PNG file contents (a string) of the RGB image (a uint8 array
+    of the shape (rows, columns, 3), the row 0 at the top), compressed by
+    zlib at the given "level".
+
+    Example:
+
+    >>> from numpy import zeros
+    >>> data = png_data(zeros((2, 3, 3), dtype="uint8"))
+    >>> data[1:4], data[12:16], len(data)
+    ('PNG', 'IHDR', 68)
+
+    """
+    import struct
+    import zlib
+    from numpy import asarray, zeros
+    image = asarray(image, dtype="uint8")
+    rows, columns = image.shape[:2]
+    # each row starts with the filter type 0 (none)
+    raw = zeros((rows, columns*3 + 1), dtype="uint8")
+    raw[:, 1:] = image.reshape((rows, columns*3))
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + \
+                struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+    header = struct.pack(">IIBBBBB", columns, rows, 8, 2, 0, 0, 0)
+    return "\x89PNG\r\n\x1a\n" + chunk("IHDR", header) + \
+            chunk("IDAT", zlib.compress(raw.tostring(), level)) + \
+            chunk("IEND", "")
+
+class Renderer:
+    """
+    Renders a series of solutions on a fixed triangular mesh into PNG files.
+
+    The mesh is set up once: the "numpy" backend locates the pixel centers
+    in the elements (see Mesh.locate()) and each frame only interpolates the
+    solution there and colors the pixels; the "mayavi" backend builds the
+    triangular_mesh pipeline once and each frame only replaces its scalars.
+    The default backend "auto" uses mayavi if it can be imported. The
+    longer side of the numpy image has "resolution" pixels.
+
+    Example:
+
+    >>> import femhub
+    >>> m = femhub.Mesh([[0.0,1.0],[1.0,1.0],[1.0,0.0],[0.0,0.0],],[[1,0,2],[2,0,3],],[[3,2,1],[2,1,2],[1,0,3],[0,3,4],],[])
+    >>> r = Renderer(m, resolution=4, backend="numpy")
+    >>> image = r.image([0, 1, 1, 0])
+    >>> image.shape, image[0, 0].tolist(), image[0, 3].tolist()
+    ((4, 4, 3), [0, 0, 128], [128, 0, 0])
+    >>> r.render([0, 1, 1, 0], "a.png") # writes the PNG file
+
+    """
+
+    def __init__(self, mesh, resolution=400, backend="auto", colorbar=False,
+            view=(0, 0)):
+        if backend == "auto":
+            try:
+                import enthought.mayavi
+                backend = "mayavi"
+            except ImportError:
+                backend = "numpy"
+        if backend == "numpy":
+            self._setup_raster(mesh, resolution)
+        elif backend == "mayavi":
+            self._setup_mayavi(mesh, colorbar, view)
+        else:
+            raise ValueError("Unknown backend: %s" % backend)
+        self.backend = backend
+
+    def _setup_raster(self, mesh, resolution):
+        from numpy import arange, meshgrid, column_stack, ceil
+        nodes = mesh.node_array[:, :2]
+        lo = nodes.min(axis=0)
+        hi = nodes.max(axis=0)
+        h = max((hi - lo).max(), 1e-300)/resolution
+        self.columns = max(1, int(ceil((hi[0] - lo[0])/h)))
+        self.rows = max(1, int(ceil((hi[1] - lo[1])/h)))
+        # the pixel centers, the row 0 at the top
+        x, y = meshgrid(lo[0] + (arange(self.columns) + 0.5)*h,
+                hi[1] - (arange(self.rows) + 0.5)*h)
+        elements, bary = mesh.locate(column_stack([x.ravel(), y.ravel()]))
+        self.inside = (elements >= 0).nonzero()[0]
+        self.pixel_elements = elements[self.inside]
+        self.pixel_nodes = mesh.element_array[self.pixel_elements]
+        self.pixel_bary = bary[self.inside]
+        self.n_nodes = len(nodes)
+        self.lut = _jet()
+
+    def _setup_mayavi(self, mesh, colorbar, view):
+        from numpy import zeros
+        from enthought.mayavi import mlab
+        mlab.options.offscreen = True
+        mlab.clf()
+        nodes = mesh.node_array
+        z = zeros(len(nodes))
+        self._surface = mlab.triangular_mesh(nodes[:, 0], nodes[:, 1], z,
+                mesh.element_array, scalars=z)
+        scene = mlab.get_engine().current_scene
+        scene.scene.background = (1.0, 1.0, 1.0)
+        scene.scene.foreground = (0.0, 0.0, 0.0)
+        if colorbar:
+            mlab.colorbar(orientation="vertical")
+        if view:
+            mlab.view(view[0], view[1])
+        self._mlab = mlab
+
+    def image(self, sln, vmin=None, vmax=None):
+        """
+        Returns the RGB image (a uint8 array of the shape (rows, columns,
+        3)) of the solution "sln" (a value per node, interpolated linearly,
+        or a value per element) by the numpy backend.
+
+        The values from "vmin" to "vmax" (by default the range of the
+        frame, pass fixed ones to compare frames) are colored by the "jet"
+        colormap, the pixels outside of the mesh are white.
+        """
+        from numpy import asarray, empty, clip
+        sln = asarray(sln, dtype="float64")
+        if len(sln) == self.n_nodes:
+            values = (sln[self.pixel_nodes]*self.pixel_bary).sum(axis=1)
+        else:
+            values = sln[self.pixel_elements]
+        if vmin is None:
+            vmin = values.min() if len(values) > 0 else 0.
+        if vmax is None:
+            vmax = values.max() if len(values) > 0 else 1.
+        scale = (len(self.lut) - 1)/float(vmax - vmin) if vmax > vmin else 0.
+        index = clip((values - vmin)*scale + 0.5, 0, len(self.lut) - 1)
+        image = empty((self.rows*self.columns, 3), dtype="uint8")
+        image[:] = 255
+        image[self.inside] = self.lut[index.astype("int64")]
+        return image.reshape((self.rows, self.columns, 3))
+
+    def render(self, sln, filename="a.png", vmin=None, vmax=None):
+        """
+        Renders the solution "sln" (see image()) into the PNG file
+        "filename".
+        """
+        if self.backend == "mayavi":
+            self._surface.mlab_source.scalars = sln
+            if vmin is not None and vmax is not None:
+                lut = self._surface.module_manager.scalar_lut_manager
+                lut.data_range = (vmin, vmax)
+            self._mlab.savefig(filename)
+            return
+        f = open(filename, "wb")
+        try:
+            f.write(png_data(self.image(sln, vmin, vmax)))
+        finally:
+            f.close()
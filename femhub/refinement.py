@@ -0,0 +1,260 @@
+"""
+Bulk mesh refinement.
+
+The functions in this module work on whole meshes stored in NumPy arrays:
+the nodes as a float array of the shape (N, 2), the triangles as an integer
+array of the shape (M, 3) and the boundary edges as an integer array of the
+shape (B, 3) with the rows [a, b, marker].
+"""
+
+from numpy import asarray, empty, concatenate, column_stack, unique, \
+        searchsorted, minimum, maximum
+
+def edge_keys(a, b, n):
+    """
+    Returns the integer keys of the (undirected) edges between the nodes "a"
+    and "b" (arrays), for a mesh with "n" nodes.
+
+    Example:
+
+    >>> edge_keys(asarray([0, 2]), asarray([2, 0]), 3).tolist()
+    [2, 2]
+
+    """
+    a = asarray(a, dtype="int64")
+    b = asarray(b, dtype="int64")
+    return minimum(a, b)*n + maximum(a, b)
+
+def refine_red(nodes, elements, boundaries):
+    """
+    Refines all triangles uniformly, each into 4 triangles.
+
+    A new node is created in the middle of every edge. The triangle
+    (a, b, c) with the midpoints d (of ab), e (of bc) and f (of ca) is
+    replaced by (a, d, f), (d, b, e), (f, d, e), (f, e, c), the same
+    children as Mesh.refine_element() creates. The children of the element
+    i are the elements 4*i, ..., 4*i+3. Each boundary edge [a, b, marker]
+    is replaced by [a, d, marker], [d, b, marker].
+
+    The old nodes keep their indices, the midpoints are appended after them
+    (ordered by the edge). Returns the tuple (nodes, elements, boundaries).
+
+    Example:
+
+    >>> n, e, b = refine_red([[0., 0.], [1., 0.], [0., 1.]], [[0, 1, 2]], [[0, 1, 1], [1, 2, 2], [2, 0, 3]])
+    >>> n.tolist()
+    [[0.0, 0.0], [1.0, 0.0], [0.0, 1.0], [0.5, 0.0], [0.0, 0.5], [0.5, 0.5]]
+    >>> e.tolist()
+    [[0, 3, 4], [3, 1, 5], [4, 3, 5], [4, 5, 2]]
+    >>> b.tolist()
+    [[0, 3, 1], [3, 1, 1], [1, 5, 2], [5, 2, 2], [2, 4, 3], [4, 0, 3]]
+
+    """
+    nodes = asarray(nodes, dtype="float64")
+    elements = asarray(elements, dtype="int32")
+    boundaries = asarray(boundaries, dtype="int32")
+    if len(elements) == 0:
+        return nodes, empty((0, 3), dtype="int32"), boundaries
+    if elements.ndim != 2 or elements.shape[1] != 3:
+        raise ValueError("Only triangles can be refined.")
+    n = len(nodes)
+    m = len(elements)
+    a = elements[:, 0]
+    b = elements[:, 1]
+    c = elements[:, 2]
+    keys = concatenate([edge_keys(a, b, n), edge_keys(b, c, n),
+        edge_keys(c, a, n)])
+    edges, inverse = unique(keys, return_inverse=True)
+    lo = edges // n
+    hi = edges % n
+    midpoints = (nodes[lo] + nodes[hi])/2.
+    mid = (inverse + n).astype("int32")
+    d = mid[:m]
+    e = mid[m:2*m]
+    f = mid[2*m:]
+    children = column_stack([a, d, f, d, b, e, f, d, e, f, e, c])
+    new_elements = children.reshape((4*m, 3))
+    new_nodes = concatenate([nodes, midpoints])
+    if len(boundaries) == 0:
+        return new_nodes, new_elements, empty((0, 3), dtype="int32")
+    ba = boundaries[:, 0]
+    bb = boundaries[:, 1]
+    marker = boundaries[:, 2]
+    bkeys = edge_keys(ba, bb, n)
+    pos = searchsorted(edges, bkeys)
+    pos[pos == len(edges)] = 0
+    if (edges[pos] != bkeys).any():
+        raise ValueError("Boundary edge is not an edge of any element.")
+    bm = (pos + n).astype("int32")
+    new_boundaries = column_stack([ba, bm, marker, bm, bb, marker])
+    return new_nodes, new_elements, new_boundaries.reshape((2*len(boundaries), 3))
+
+def mark_bulk(indicators, fraction):
+    """
+    Returns the sorted list of indices of the elements to refine, given the
+    per element error "indicators" (nonnegative).
+
+    The elements with the largest indicators are marked until the sum of
+    their indicators reaches "fraction" of the sum of all indicators
+    (Doerfler marking). Pass the squares of the error estimates to get the
+    usual energy norm criterion.
+
+    Example:
+
+    >>> mark_bulk([0.1, 0.5, 0.2, 0.2], 0.5)
+    [1]
+    >>> mark_bulk([0.1, 0.5, 0.2, 0.2], 0.7)
+    [1, 2]
+    >>> mark_bulk([0., 0.], 0.5)
+    []
+
+    """
+    from numpy import argsort, cumsum
+    eta = asarray(indicators, dtype="float64")
+    if eta.ndim != 1:
+        raise ValueError("The indicators must be a 1D array.")
+    if (eta < 0).any():
+        raise ValueError("The indicators must be nonnegative.")
+    if len(eta) == 0:
+        return []
+    total = eta.sum()
+    if total <= 0:
+        return []
+    order = argsort(-eta, kind="mergesort")
+    cum = cumsum(eta[order])
+    k = int(searchsorted(cum, fraction*total*(1 - 1e-12))) + 1
+    return sorted(order[:k].tolist())
+
+class Bisection:
+    """
+    Newest vertex bisection of a triangular mesh.
+
+    The elements are triples (a, b, c), where "a" is the newest vertex and
+    the edge (b, c) opposite to it is the refinement edge. An element is
+    bisected by the midpoint p of (b, c) into (p, a, b) and (p, c, a), so
+    the children are positively oriented if the parent is, and p is their
+    newest vertex. The first child replaces the parent in the element list,
+    the second one is appended.
+
+    The class keeps a dictionary from each edge to its elements, so that
+    refine() only touches the elements around the refined region.
+
+    Example:
+
+    >>> nodes = [[0., 0.], [1., 0.], [1., 1.], [0., 1.]]
+    >>> elements = [(1, 2, 0), (3, 0, 2)]
+    >>> b = Bisection(nodes, elements)
+    >>> b.refine([0])
+    [(0, 2, 4), (1, 3, 4)]
+    >>> elements
+    [(4, 1, 2), (4, 3, 0), (4, 0, 1), (4, 2, 3)]
+    >>> b.refine([0])
+    [(0, 4, 5)]
+    >>> elements
+    [(5, 4, 1), (4, 3, 0), (4, 0, 1), (4, 2, 3), (5, 2, 4)]
+    >>> nodes[4:]
+    [[0.5, 0.5], [1.0, 0.5]]
+
+    In the first step the neighbour 1 is bisected too, because the
+    refinement edge of the element 0 is its edge.
+
+    """
+
+    def __init__(self, nodes, elements):
+        self._nodes = nodes
+        self._elements = elements
+        self._edges = {}
+        for t, (a, b, c) in enumerate(elements):
+            self._add(t, a, b, c)
+
+    def _add(self, t, a, b, c):
+        edges = self._edges
+        for key in [(a, b), (b, c), (c, a)]:
+            key = (min(key), max(key))
+            ts = edges.get(key)
+            if ts is None:
+                edges[key] = [t]
+            else:
+                ts.append(t)
+
+    def _remove(self, t, a, b, c):
+        edges = self._edges
+        for key in [(a, b), (b, c), (c, a)]:
+            key = (min(key), max(key))
+            ts = edges[key]
+            ts.remove(t)
+            if not ts:
+                del edges[key]
+
+    def elements_of_edge(self, a, b):
+        """
+        Returns the list of elements containing the edge (a, b).
+        """
+        return self._edges.get((min(a, b), max(a, b)), [])
+
+    def refine(self, marked, on_split=None, on_bisect=None):
+        """
+        Bisects the elements "marked" (a list of indices) and as many of
+        their neighbours as needed to keep the mesh conforming.
+
+        The function on_split(a, b, p) is called, when the edge (a, b) is
+        split by the new node p, and on_bisect(parent, child1, child2, p)
+        after each bisection. Returns the list of bisections (parent,
+        child, p) in the order they were done, the parent index is the
+        index of the first child.
+        """
+        elements = self._elements
+        nodes = self._nodes
+        # closure: every element with a marked edge has its refinement edge
+        # marked
+        refine_edges = set()
+        stack = []
+        for t in marked:
+            a, b, c = elements[t]
+            key = (min(b, c), max(b, c))
+            if key not in refine_edges:
+                refine_edges.add(key)
+                stack.append(key)
+        while stack:
+            key = stack.pop()
+            for t in self._edges.get(key, ()):
+                a, b, c = elements[t]
+                r = (min(b, c), max(b, c))
+                if r not in refine_edges:
+                    refine_edges.add(r)
+                    stack.append(r)
+        midpoints = {}
+        todo = []
+        for key in sorted(refine_edges):
+            todo.extend(self._edges.get(key, ()))
+        todo.sort(reverse=True)
+        bisections = []
+        while todo:
+            t = todo.pop()
+            a, b, c = elements[t]
+            key = (min(b, c), max(b, c))
+            if key not in refine_edges:
+                continue
+            p = midpoints.get(key)
+            if p is None:
+                bx, by = nodes[b]
+                cx, cy = nodes[c]
+                p = len(nodes)
+                nodes.append([(bx + cx)/2., (by + cy)/2.])
+                midpoints[key] = p
+                if on_split is not None:
+                    on_split(b, c, p)
+            self._remove(t, a, b, c)
+            t2 = len(elements)
+            elements[t] = (p, a, b)
+            elements.append((p, c, a))
+            self._add(t, p, a, b)
+            self._add(t2, p, c, a)
+            if on_bisect is not None:
+                on_bisect((a, b, c), (p, a, b), (p, c, a), p)
+            if not self._edges.get(key):
+                refine_edges.discard(key)
+            bisections.append((t, t2, p))
+            todo.append(t2)
+            todo.append(t)
+        return bisections
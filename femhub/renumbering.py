@@ -0,0 +1,168 @@
+"""
+Node and element orderings.
+
+The functions in this module compute permutations of the nodes or elements
+of a mesh (stored in NumPy arrays, see refinement.py). A permutation "perm"
+is an integer array, the new item i is the old item perm[i], so that any
+per node (per element) array "u" is renumbered by u[perm].
+"""
+
+from numpy import asarray, zeros, argsort, empty, arange
+
+def hilbert_keys(points, order=16):
+    """
+    Returns the indices of the points along the Hilbert curve through their
+    bounding box (the points are scaled to the grid of 2**order x 2**order
+    cells), as an int64 array.
+
+    Example:
+
+    >>> hilbert_keys([[0, 0], [0, 1], [1, 1], [1, 0]], 1).tolist()
+    [0, 1, 2, 3]
+
+    """
+    points = asarray(points, dtype="float64")
+    if len(points) == 0:
+        return zeros(0, dtype="int64")
+    lo = points.min(axis=0)
+    size = float((points.max(axis=0) - lo).max())
+    if size <= 0:
+        size = 1.
+    n = 1 << order
+    m = n - 1
+    x = ((points[:, 0] - lo[0])/size*m).astype("int64")
+    y = ((points[:, 1] - lo[1])/size*m).astype("int64")
+    d = zeros(len(points), dtype="int64")
+    s = n >> 1
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        d += s*s*((3*rx) ^ ry)
+        flip = ~ry & rx
+        x[flip] = m - x[flip]
+        y[flip] = m - y[flip]
+        swap = ~ry
+        t = x[swap]
+        x[swap] = y[swap]
+        y[swap] = t
+        s >>= 1
+    return d
+
+def hilbert_permutation(points):
+    """
+    Returns the permutation sorting the points along the Hilbert curve
+    through their bounding box (the points with the same key keep their
+    order).
+
+    Points that are close in this order are also close in the plane, which
+    keeps the searches that start from the previous point short (see the
+    insertion order in delaunay.py).
+
+    Example:
+
+    >>> hilbert_permutation([[1, 0], [0, 0], [1, 1], [0, 1]]).tolist()
+    [1, 3, 2, 0]
+
+    """
+    return argsort(hilbert_keys(points), kind="mergesort")
+
+def reverse_cuthill_mckee(indptr, indices):
+    """
+    Returns the reverse Cuthill-McKee permutation of the graph given in the
+    compressed sparse row format (see smoothing.node_adjacency()).
+
+    Each connected component is numbered by a breadth first search from a
+    pseudo-peripheral node, visiting the neighbours by increasing degree;
+    the resulting order is reversed. It reduces the bandwidth of the
+    matrices assembled on the mesh.
+
+    Example:
+
+    >>> from smoothing import node_adjacency
+    >>> indptr, indices = node_adjacency(6, [[0, 5, 1], [1, 5, 4], [1, 4, 2], [2, 4, 3]])
+    >>> reverse_cuthill_mckee(indptr, indices).tolist()
+    [0, 5, 1, 4, 2, 3]
+
+    """
+    indptr = asarray(indptr).tolist()
+    indices = asarray(indices).tolist()
+    n = len(indptr) - 1
+    degree = [indptr[i+1] - indptr[i] for i in range(n)]
+    nbrs = [sorted(indices[indptr[i]:indptr[i+1]], key=degree.__getitem__)
+            for i in range(n)]
+    visited = [False]*n
+    order = []
+    for start in sorted(range(n), key=degree.__getitem__):
+        if visited[start]:
+            continue
+        start = _peripheral_node(start, nbrs, degree)
+        visited[start] = True
+        head = len(order)
+        order.append(start)
+        while head < len(order):
+            for j in nbrs[order[head]]:
+                if not visited[j]:
+                    visited[j] = True
+                    order.append(j)
+            head += 1
+    order.reverse()
+    return asarray(order, dtype="int64")
+
+def _peripheral_node(start, nbrs, degree):
+    """
+    Returns a node with a large eccentricity in the component of "start":
+    the breadth first search is repeated from the node of the smallest
+    degree in the last level, while the number of levels grows.
+    """
+    levels = 0
+    while True:
+        level = [start]
+        seen = set(level)
+        count = 0
+        while True:
+            next_level = []
+            for i in level:
+                for j in nbrs[i]:
+                    if j not in seen:
+                        seen.add(j)
+                        next_level.append(j)
+            if not next_level:
+                break
+            level = next_level
+            count += 1
+        if count <= levels:
+            return start
+        levels = count
+        start = min(level, key=degree.__getitem__)
+
+def inverse_permutation(perm):
+    """
+    Returns the inverse of the permutation "perm": the new index of each
+    old item.
+
+    Example:
+
+    >>> inverse_permutation([2, 0, 1]).tolist()
+    [1, 2, 0]
+
+    """
+    perm = asarray(perm)
+    inverse = empty(len(perm), dtype="int64")
+    inverse[perm] = arange(len(perm))
+    return inverse
+
+def bandwidth(elements):
+    """
+    Returns the largest difference of the node indices within an element
+    (the half bandwidth of the matrices assembled on the mesh).
+
+    Example:
+
+    >>> bandwidth([[0, 1, 5], [1, 2, 3]])
+    5
+
+    """
+    elements = asarray(elements)
+    if len(elements) == 0:
+        return 0
+    return int((elements.max(axis=1) - elements.min(axis=1)).max())
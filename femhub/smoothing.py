@@ -0,0 +1,160 @@
+"""
+Mesh smoothing.
+
+The functions in this module move the nodes of a mesh (stored in NumPy
+arrays, see refinement.py) to improve the shape of its elements, without
+changing the connectivity. All nodes are moved at once in each sweep.
+"""
+
+from numpy import asarray, arange, argsort, bincount, concatenate, cumsum, \
+        diff, repeat, unique, zeros
+
+from geometry import element_coordinates, orientation_determinants
+from refinement import edge_keys
+
+def node_adjacency(n, elements):
+    """
+    Returns the node adjacency of the mesh with "n" nodes as a pair of
+    arrays (indptr, indices) in the compressed sparse row format: the
+    neighbours of the node i are indices[indptr[i]:indptr[i+1]] (sorted).
+
+    Two nodes are neighbours if they are joined by an edge of an element.
+
+    Example:
+
+    >>> indptr, indices = node_adjacency(4, [[0, 1, 2], [2, 1, 3]])
+    >>> indptr.tolist()
+    [0, 2, 5, 8, 10]
+    >>> indices.tolist()
+    [1, 2, 0, 2, 3, 0, 1, 3, 1, 2]
+
+    """
+    elements = asarray(elements, dtype="int32")
+    if len(elements) == 0:
+        return zeros(n + 1, dtype="int64"), zeros(0, dtype="int32")
+    k = elements.shape[1]
+    a = elements.ravel()
+    b = elements[:, list(range(1, k)) + [0]].ravel()
+    keys = unique(edge_keys(a, b, n))
+    lo = keys // n
+    hi = keys % n
+    rows = concatenate([lo, hi])
+    cols = concatenate([hi, lo])
+    order = argsort(rows*n + cols)
+    indptr = concatenate([[0], cumsum(bincount(rows, minlength=n))])
+    return indptr, cols[order].astype("int32")
+
+def laplacian_positions(nodes, indptr, indices):
+    """
+    Returns the new positions of all nodes for Laplacian smoothing: each
+    node is moved to the average of its neighbours (given in the format
+    returned by node_adjacency()). Nodes without neighbours stay.
+
+    Example:
+
+    >>> indptr, indices = node_adjacency(4, [[0, 1, 2], [0, 2, 3]])
+    >>> laplacian_positions([[0., 0.], [1., 0.], [1., 1.], [0., 1.]], indptr, indices).tolist()
+    [[0.6666666666666666, 0.6666666666666666], [0.5, 0.5], [0.3333333333333333, 0.3333333333333333], [0.5, 0.5]]
+
+    """
+    nodes = asarray(nodes, dtype="float64")
+    n = len(nodes)
+    degree = diff(indptr)
+    rows = repeat(arange(n), degree)
+    result = nodes.copy()
+    has = degree > 0
+    for j in range(2):
+        s = bincount(rows, weights=nodes[indices, j], minlength=n)
+        result[has, j] = s[has]/degree[has]
+    return result
+
+def odt_positions(nodes, elements):
+    """
+    Returns the new positions of all nodes for the optimal Delaunay
+    triangulation (ODT) smoothing: each node is moved to the average of the
+    circumcenters of its triangles, weighted by their areas. Nodes without
+    triangles stay. Only triangles are supported.
+
+    Example:
+
+    >>> odt_positions([[0., 0.], [2., 0.], [0., 2.], [2., 2.], [0.5, 0.5]], [[0, 1, 4], [1, 3, 4], [3, 2, 4], [2, 0, 4]])[4].tolist()
+    [1.0, 1.0]
+
+    """
+    nodes = asarray(nodes, dtype="float64")
+    elements = asarray(elements, dtype="int32")
+    n = len(nodes)
+    result = nodes.copy()
+    if len(elements) == 0:
+        return result
+    if elements.shape[1] != 3:
+        raise ValueError("ODT smoothing needs a triangular mesh.")
+    xy = element_coordinates(nodes, elements)
+    b = xy[:, 1] - xy[:, 0]
+    c = xy[:, 2] - xy[:, 0]
+    d = b[:, 0]*c[:, 1] - b[:, 1]*c[:, 0]
+    b2 = (b**2).sum(axis=1)
+    c2 = (c**2).sum(axis=1)
+    area = abs(d)/2.
+    safe = d != 0
+    cx = xy[:, 0, 0].copy()
+    cy = xy[:, 0, 1].copy()
+    cx[safe] += (c[safe, 1]*b2[safe] - b[safe, 1]*c2[safe])/(2*d[safe])
+    cy[safe] += (b[safe, 0]*c2[safe] - c[safe, 0]*b2[safe])/(2*d[safe])
+    v = elements.ravel()
+    w = repeat(area, 3)
+    total = bincount(v, weights=w, minlength=n)
+    has = total > 0
+    for j, center in enumerate([cx, cy]):
+        s = bincount(v, weights=w*repeat(center, 3), minlength=n)
+        result[has, j] = s[has]/total[has]
+    return result
+
+def smooth(nodes, elements, fixed, iterations=1, method="laplacian"):
+    """
+    Smoothes the mesh by "iterations" sweeps of the "method" ("laplacian"
+    or "odt", see laplacian_positions() and odt_positions()).
+
+    The nodes with fixed[i] True do not move. A move is rejected (the node
+    stays where it was before the sweep) if it would invert an element that
+    was positively oriented before, see
+    geometry.orientation_determinants().
+
+    Returns the tuple (nodes, rejected), where "nodes" is a new array and
+    "rejected" is the number of rejected moves.
+
+    Example:
+
+    >>> nodes = [[0., 0.], [2., 0.], [0., 2.], [2., 2.], [0.2, 1.5]]
+    >>> elements = [[0, 1, 4], [1, 3, 4], [3, 2, 4], [2, 0, 4]]
+    >>> new, rejected = smooth(nodes, elements, [True]*4 + [False])
+    >>> new[4].tolist(), rejected
+    ([1.0, 1.0], 0)
+
+    """
+    nodes = asarray(nodes, dtype="float64").copy()
+    elements = asarray(elements, dtype="int32")
+    movable = ~asarray(fixed, dtype="bool")
+    if method == "laplacian":
+        indptr, indices = node_adjacency(len(nodes), elements)
+    elif method != "odt":
+        raise ValueError("Unknown smoothing method: %s" % method)
+    rejected = 0
+    for i in range(iterations):
+        if method == "laplacian":
+            new = laplacian_positions(nodes, indptr, indices)
+        else:
+            new = odt_positions(nodes, elements)
+        new[~movable] = nodes[~movable]
+        positive = orientation_determinants(nodes, elements) > 0
+        while True:
+            inverted = positive & \
+                    (orientation_determinants(new, elements) <= 0)
+            if not inverted.any():
+                break
+            back = unique(elements[inverted])
+            back = back[(new[back] != nodes[back]).any(axis=1)]
+            rejected += len(back)
+            new[back] = nodes[back]
+        nodes = new
+    return nodes, rejected
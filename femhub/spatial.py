@@ -0,0 +1,296 @@
+"""
+Spatial indexing helpers.
+
+The structures in this module bucket points and segments into the cells of a
+uniform grid, so that geometric queries (the nearest candidates for a new
+triangle, the edges close to a segment, ...) only look at a small
+neighbourhood instead of the whole point or edge list.
+"""
+
+from math import floor, sqrt
+
+def grid_cell_size(pts_list, per_cell=1.):
+    """
+    Returns a cell size for a grid holding the points "pts_list", so that
+    there is about "per_cell" points in each cell.
+
+    Example:
+
+    >>> grid_cell_size([[0, 0], [0, 1], [1, 1], [1, 0]])
+    0.5
+
+    """
+    if len(pts_list) == 0:
+        return 1.
+    min_x, min_y = max_x, max_y = pts_list[0]
+    for x, y in pts_list:
+        if x < min_x: min_x = x
+        if y < min_y: min_y = y
+        if x > max_x: max_x = x
+        if y > max_y: max_y = y
+    w = float(max_x - min_x)
+    h = float(max_y - min_y)
+    n = len(pts_list) / float(per_cell)
+    if w*h > 0:
+        cell = sqrt(w*h/n)
+    else:
+        cell = max(w, h)/sqrt(n)
+    if cell <= 0:
+        cell = 1.
+    return cell
+
+class BucketGrid:
+    """
+    A uniform grid of buckets, each holding a set of keys.
+
+    A key is inserted into every cell that its bounding box overlaps, so a
+    query returns a superset of the keys whose bounding boxes overlap the
+    query box. The grid is unbounded (cells are created on demand), only the
+    range of nonempty cell indices is tracked.
+
+    Example:
+
+    >>> g = BucketGrid(0.5)
+    >>> g.insert((0, 1), 0.1, 0.1, 0.9, 0.9)
+    >>> g.insert((1, 2), 0.9, 0.1, 0.9, 0.9)
+    >>> sorted(g.query(0, 0, 0.2, 0.2))
+    [(0, 1)]
+    >>> sorted(g.query(0.6, 0.6, 1, 1))
+    [(0, 1), (1, 2)]
+    >>> g.remove((0, 1), 0.1, 0.1, 0.9, 0.9)
+    >>> sorted(g.query(0.6, 0.6, 1, 1))
+    [(1, 2)]
+
+    """
+
+    def __init__(self, cell_size):
+        self._h = float(cell_size)
+        self._cells = {}
+        self._range = None
+
+    @property
+    def cell_size(self):
+        return self._h
+
+    @property
+    def cell_range(self):
+        """
+        Returns (i_min, j_min, i_max, j_max) of all cells that were ever
+        used, or None for an empty grid.
+        """
+        return self._range
+
+    def cell(self, x, y):
+        """
+        Returns the (i, j) index of the cell containing the point (x, y).
+        """
+        return int(floor(x/self._h)), int(floor(y/self._h))
+
+    def _cell_box(self, xmin, ymin, xmax, ymax):
+        i0, j0 = self.cell(xmin, ymin)
+        i1, j1 = self.cell(xmax, ymax)
+        return i0, j0, i1, j1
+
+    def insert(self, key, xmin, ymin, xmax, ymax):
+        """
+        Inserts "key" into all cells overlapping the given box.
+        """
+        i0, j0, i1, j1 = self._cell_box(xmin, ymin, xmax, ymax)
+        cells = self._cells
+        for i in range(i0, i1+1):
+            for j in range(j0, j1+1):
+                bucket = cells.get((i, j))
+                if bucket is None:
+                    bucket = cells[(i, j)] = set()
+                bucket.add(key)
+        if self._range is None:
+            self._range = (i0, j0, i1, j1)
+        else:
+            r = self._range
+            self._range = (min(r[0], i0), min(r[1], j0),
+                    max(r[2], i1), max(r[3], j1))
+
+    def insert_point(self, key, x, y):
+        self.insert(key, x, y, x, y)
+
+    def remove(self, key, xmin, ymin, xmax, ymax):
+        """
+        Removes "key" from all cells overlapping the given box (the box must
+        be the same as the one used in insert()).
+        """
+        i0, j0, i1, j1 = self._cell_box(xmin, ymin, xmax, ymax)
+        cells = self._cells
+        for i in range(i0, i1+1):
+            for j in range(j0, j1+1):
+                bucket = cells.get((i, j))
+                if bucket is not None:
+                    bucket.discard(key)
+
+    def bucket(self, i, j):
+        """
+        Returns the set of keys in the cell (i, j) (empty if the cell is
+        not used).
+        """
+        return self._cells.get((i, j), ())
+
+    def query_cells(self, i0, j0, i1, j1):
+        """
+        Returns the set of keys in all cells (i, j) with i0 <= i <= i1 and
+        j0 <= j <= j1.
+        """
+        r = self._range
+        result = set()
+        if r is None:
+            return result
+        i0 = max(i0, r[0]); j0 = max(j0, r[1])
+        i1 = min(i1, r[2]); j1 = min(j1, r[3])
+        cells = self._cells
+        if (i1 - i0 + 1)*(j1 - j0 + 1) > len(cells):
+            for (i, j), bucket in cells.items():
+                if i0 <= i <= i1 and j0 <= j <= j1:
+                    result.update(bucket)
+            return result
+        for i in range(i0, i1+1):
+            for j in range(j0, j1+1):
+                bucket = cells.get((i, j))
+                if bucket:
+                    result.update(bucket)
+        return result
+
+    def query(self, xmin, ymin, xmax, ymax):
+        """
+        Returns the set of keys in all cells overlapping the given box.
+        """
+        i0, j0, i1, j1 = self._cell_box(xmin, ymin, xmax, ymax)
+        return self.query_cells(i0, j0, i1, j1)
+
+    def query_ring(self, i0, j0, i1, j1, r):
+        """
+        Returns the set of keys in the ring of cells at the (Chebyshev)
+        distance "r" around the block of cells [i0, i1] x [j0, j1].
+        """
+        if r == 0:
+            return self.query_cells(i0, j0, i1, j1)
+        result = set()
+        result.update(self.query_cells(i0-r, j0-r, i1+r, j0-r))
+        result.update(self.query_cells(i0-r, j1+r, i1+r, j1+r))
+        result.update(self.query_cells(i0-r, j0-r+1, i0-r, j1+r-1))
+        result.update(self.query_cells(i1+r, j0-r+1, i1+r, j1+r-1))
+        return result
+
+def segment_cells(h, ax, ay, bx, by, eps=0.):
+    """
+    Returns the list of the cells (i, j) of the grid with the cell size "h"
+    that the segment from (ax, ay) to (bx, by), thickened by "eps", passes
+    through.
+
+    The segment is walked column by column, in each column only the cells
+    between the lowest and the highest point of the segment in it are taken,
+    so a long segment gets about (length/h) cells, not the (length/h)**2
+    cells of its bounding box.
+
+    Example:
+
+    >>> segment_cells(1., 0.5, 0.2, 2.5, 1.2)
+    [(0, 0), (1, 0), (2, 0), (2, 1)]
+    >>> segment_cells(1., 0.5, 0.5, 0.5, 2.5)
+    [(0, 0), (0, 1), (0, 2)]
+
+    """
+    if ax > bx:
+        ax, ay, bx, by = bx, by, ax, ay
+    i0 = int(floor((ax - eps)/h))
+    i1 = int(floor((bx + eps)/h))
+    dx = bx - ax
+    cells = []
+    for i in range(i0, i1+1):
+        if dx > 0:
+            # the part of the segment within the column
+            x0 = min(max(i*h - eps, ax), bx)
+            x1 = min(max((i+1)*h + eps, ax), bx)
+            y0 = ay + (by - ay)*(x0 - ax)/dx
+            y1 = ay + (by - ay)*(x1 - ax)/dx
+        else:
+            y0, y1 = ay, by
+        j0 = int(floor((min(y0, y1) - eps)/h))
+        j1 = int(floor((max(y0, y1) + eps)/h))
+        for j in range(j0, j1+1):
+            cells.append((i, j))
+    return cells
+
+class BackgroundGrid:
+    """
+    A function given by its values on the nodes of a uniform grid, bilinearly
+    interpolated in between.
+
+    The grid covers the rectangle [xmin, xmax] x [ymin, ymax] and "values"
+    is the list of its rows, from the bottom (y = ymin) to the top, each
+    row from the left (x = xmin) to the right. Outside of the rectangle the
+    value at the nearest point of the rectangle is returned.
+
+    It is used as a target element size, see triangulation.size_function().
+
+    Example:
+
+    >>> g = BackgroundGrid(0, 0, 1, 1, [[0.1, 0.2], [0.3, 0.4]])
+    >>> g(0, 0)
+    0.1
+    >>> g(1, 1)
+    0.4
+    >>> round(g(0.5, 0.5), 6)
+    0.25
+    >>> g(-1, 0)
+    0.1
+
+    """
+
+    def __init__(self, xmin, ymin, xmax, ymax, values):
+        self._xmin = float(xmin)
+        self._ymin = float(ymin)
+        self._ny = len(values)
+        self._nx = len(values[0])
+        if self._nx < 2 or self._ny < 2:
+            raise ValueError("The grid needs at least 2 x 2 values.")
+        for row in values:
+            if len(row) != self._nx:
+                raise ValueError("All rows must have the same length.")
+        self._dx = (xmax - xmin)/float(self._nx - 1)
+        self._dy = (ymax - ymin)/float(self._ny - 1)
+        if self._dx <= 0 or self._dy <= 0:
+            raise ValueError("The rectangle is empty.")
+        self._values = [[float(v) for v in row] for row in values]
+
+    @classmethod
+    def from_function(cls, f, xmin, ymin, xmax, ymax, nx=20, ny=20):
+        """
+        Samples the function f(x, y) on the grid of nx x ny nodes.
+
+        Example:
+
+        >>> g = BackgroundGrid.from_function(lambda x, y: x + y, 0, 0, 1, 1)
+        >>> round(g(0.25, 0.5), 6)
+        0.75
+
+        """
+        values = []
+        for j in range(ny):
+            y = ymin + (ymax - ymin)*j/float(ny - 1)
+            row = []
+            for i in range(nx):
+                x = xmin + (xmax - xmin)*i/float(nx - 1)
+                row.append(f(x, y))
+            values.append(row)
+        return cls(xmin, ymin, xmax, ymax, values)
+
+    def __call__(self, x, y):
+        s = (x - self._xmin)/self._dx
+        t = (y - self._ymin)/self._dy
+        s = min(max(s, 0.), self._nx - 1.)
+        t = min(max(t, 0.), self._ny - 1.)
+        i = min(int(s), self._nx - 2)
+        j = min(int(t), self._ny - 2)
+        s -= i
+        t -= j
+        v = self._values
+        return (1-t)*((1-s)*v[j][i] + s*v[j][i+1]) + \
+                t*((1-s)*v[j+1][i] + s*v[j+1][i+1])
@@ -0,0 +1,126 @@
+"""
+Mesh topology.
+
+The Topology class computes the adjacency of the elements of a mesh (stored
+in NumPy arrays, see refinement.py) in a few sorts: the unique edges, the
+elements on both sides of each edge, the neighbours of each element and the
+elements around each node.
+
+The edges of an element (a, b, c) are ordered (a, b), (b, c), (c, a) as in
+geometry.py. The half-edge i of the element t (going from its vertex i to
+the vertex i+1) has the index t*k + i, where k is the number of vertices of
+the elements.
+"""
+
+from numpy import asarray, zeros, arange, argsort, unique, bincount, \
+        concatenate, cumsum, column_stack
+
+from refinement import edge_keys
+
+class Topology:
+    """
+    The adjacency of the elements of a mesh with "n" nodes.
+
+    The attributes are arrays:
+
+    edges ... (E, 2) the unique edges (a, b) with a < b, sorted
+    element_edges ... (M, k) the edge index of each edge of each element
+    edge_elements ... (E, 2) the elements on both sides of each edge, the
+        element containing the half-edge (a, b) first and -1 for a missing
+        one
+    neighbours ... (M, k) the element across each edge of each element, or
+        -1 on the boundary
+    twin ... (M*k,) the opposite half-edge of each half-edge, or -1
+    node_indptr, node_indices ... the elements around each node in the
+        compressed sparse row format: the elements around the node i are
+        node_indices[node_indptr[i]:node_indptr[i+1]]
+
+    All arrays are computed by sorting, in O(M log M) time. An edge shared
+    by more than two elements raises ValueError.
+
+    Example:
+
+    >>> t = Topology(4, [[0, 1, 2], [0, 2, 3]])
+    >>> t.edges.tolist()
+    [[0, 1], [0, 2], [0, 3], [1, 2], [2, 3]]
+    >>> t.neighbours.tolist()
+    [[-1, -1, 1], [0, -1, -1]]
+    >>> t.edge_elements.tolist()
+    [[0, -1], [1, 0], [-1, 1], [0, -1], [1, -1]]
+    >>> t.elements_of_node(2).tolist()
+    [0, 1]
+    >>> t.boundary_edges().tolist()
+    [[0, 1], [1, 2], [2, 3], [3, 0]]
+
+    """
+
+    def __init__(self, n, elements):
+        elements = asarray(elements, dtype="int32")
+        if len(elements) == 0:
+            elements = elements.reshape((0, 3))
+        self.n = n
+        self.elements = elements
+        m, k = elements.shape
+        self.k = k
+        a = elements.ravel()
+        b = elements[:, list(range(1, k)) + [0]].ravel()
+        keys, inverse, counts = unique(edge_keys(a, b, n),
+                return_inverse=True, return_counts=True)
+        if (counts > 2).any():
+            raise ValueError("An edge is shared by more than two elements.")
+        self._keys = keys
+        self.edges = column_stack([keys // n, keys % n]).astype("int32")
+        self.element_edges = inverse.reshape((m, k))
+        # the half-edges grouped by their edge
+        halves = argsort(inverse, kind="mergesort")
+        first = concatenate([[0], cumsum(counts)[:-1]]).astype("int64")
+        h1 = halves[first]
+        twin = zeros(m*k, dtype="int64") - 1
+        pair = (counts == 2).nonzero()[0]
+        h2 = halves[first[pair] + 1]
+        twin[h1[pair]] = h2
+        twin[h2] = h1[pair]
+        self.twin = twin
+        t = arange(m*k) // k
+        self.neighbours = (t[twin]*(twin >= 0) - (twin < 0)).reshape((m, k))
+        # the element with the half-edge (a, b), a < b goes first
+        forward = a[h1] < b[h1]
+        other = zeros(len(keys), dtype="int64") - 1
+        other[pair] = t[h2]
+        e = column_stack([t[h1], other])
+        swap = ~forward
+        e[swap] = e[swap][:, ::-1]
+        self.edge_elements = e
+        order = argsort(a, kind="mergesort")
+        self.node_indices = (order // k).astype("int32")
+        self.node_indptr = concatenate([[0],
+            cumsum(bincount(a, minlength=n))]).astype("int64")
+
+    def elements_of_node(self, i):
+        """
+        Returns the array of the elements containing the node i.
+        """
+        return self.node_indices[self.node_indptr[i]:self.node_indptr[i+1]]
+
+    def elements_of_edge(self, a, b):
+        """
+        Returns the list of the elements containing the edge (a, b).
+        """
+        a, b = min(a, b), max(a, b)
+        key = a*self.n + b
+        keys = self._keys
+        pos = keys.searchsorted(key)
+        if pos == len(keys) or keys[pos] != key:
+            return []
+        return [t for t in self.edge_elements[pos].tolist() if t != -1]
+
+    def boundary_edges(self):
+        """
+        Returns the (B, 2) array of the half-edges without a twin (the
+        boundary of the mesh), oriented as in their elements.
+        """
+        h = (self.twin < 0).nonzero()[0]
+        t = h // self.k
+        i = h % self.k
+        return column_stack([self.elements[t, i],
+            self.elements[t, (i + 1) % self.k]])
@@ -1,9 +1,34 @@
-from numpy import exp, sqrt, array
-from pylab import plot, savefig, grid, legend, clf, pcolor, spy, axis
+import sys
+from math import exp, sqrt, ceil
+from collections import OrderedDict
+from heapq import heappush, heappop
+
+from spatial import BucketGrid, grid_cell_size, segment_cells
 
 class TriangulationError(Exception):
     pass
 
+class BoundaryError(Exception):
+    """
+    Raised when the boundary edges do not form closed loops.
+
+    The message is the same as before, the ids of the offending nodes are
+    stored in the "nodes" attribute.
+
+    Example:
+
+    >>> try:
+    ...     check_regularity([[0,1],[2,3],[3,0]])
+    ... except BoundaryError, e:
+    ...     print e, e.nodes
+    Boundary is not closed. [1, 2]
+
+    """
+
+    def __init__(self, msg, nodes=[]):
+        Exception.__init__(self, msg)
+        self.nodes = nodes
+
 def is_on_the_left(c, a, b, pts_list):
    """
    Checks whether a given point "c" lies to the left of the edge (a,b).
@@ -175,7 +200,113 @@ def is_boundary_edge(a, b, bdy_edges):
             return True
     return False
 
-def triangulate_af(pts_list, bdy_edges):
+class Front:
+    """
+    The advancing front: a set of directed edges (a, b).
+
+    Adding, removing and looking up an edge costs O(1). The edges are
+    taken out by pop() either in the LIFO order (order="stack", the edge
+    added last is taken first), or the shortest edge first
+    (order="shortest", the edge lengths are computed from "pts_list").
+
+    Example:
+
+    >>> f = Front([(0, 1), (1, 2), (2, 0)])
+    >>> f.has_edge(1, 0)
+    (0, 1)
+    >>> f.has_edge(0, 2)
+    (2, 0)
+    >>> f.remove(2, 0)
+    >>> f.add(2, 3)
+    >>> f.pop()
+    (2, 3)
+    >>> len(f)
+    2
+    >>> f = Front([(0, 1), (1, 2), (2, 0)], [[0, 0], [3, 0], [0, 1]], order="shortest")
+    >>> f.pop()
+    (2, 0)
+
+    """
+
+    def __init__(self, edges=[], pts_list=None, order="stack"):
+        if order not in ("stack", "shortest"):
+            raise ValueError("Unknown front order '%s'." % order)
+        if order == "shortest" and pts_list is None:
+            raise ValueError("The 'shortest' order needs the list of points.")
+        self._edges = OrderedDict()
+        self._pts_list = pts_list
+        self._order = order
+        self._heap = []
+        self._counter = 0
+        for a, b in edges:
+            self.add(a, b)
+
+    def __len__(self):
+        return len(self._edges)
+
+    def __iter__(self):
+        return iter(self._edges)
+
+    def __contains__(self, e):
+        return tuple(e) in self._edges
+
+    def edges(self):
+        """
+        Returns the list of edges in the front.
+        """
+        return self._edges.keys()
+
+    def has_edge(self, a, b):
+        """
+        Returns the edge (a, b) or (b, a) if it is in the front, otherwise
+        returns None.
+        """
+        if (a, b) in self._edges:
+            return (a, b)
+        if (b, a) in self._edges:
+            return (b, a)
+        return None
+
+    def add(self, a, b):
+        self._edges[(a, b)] = True
+        if self._order == "shortest":
+            ax, ay = self._pts_list[a]
+            bx, by = self._pts_list[b]
+            length = (bx - ax)**2 + (by - ay)**2
+            heappush(self._heap, (length, self._counter, a, b))
+            self._counter += 1
+
+    def remove(self, a, b):
+        del self._edges[(a, b)]
+
+    def pop(self):
+        """
+        Removes the next edge from the front and returns it.
+        """
+        if self._order == "stack":
+            e, _ = self._edges.popitem()
+            return e
+        while True:
+            _, _, a, b = heappop(self._heap)
+            if (a, b) in self._edges:
+                del self._edges[(a, b)]
+                return (a, b)
+
+    def close_or_add(self, a, b):
+        """
+        Removes the edge (a, b) from the front if it is there (in either
+        orientation), otherwise adds the edge (b, a).
+
+        Returns True if the edge was removed.
+        """
+        e = self.has_edge(a, b)
+        if e is None:
+            self.add(b, a)
+            return False
+        self.remove(*e)
+        return True
+
+def triangulate_af(pts_list, bdy_edges, order="stack"):
     """
     Create a triangulation using the advancing front method.
 
@@ -183,6 +314,8 @@ def triangulate_af(pts_list, bdy_edges):
     parameter "bdy_edges" taking your list of boundary edges, and finally the Return
     will be the list of elements.
 
+    The "order" decides which front edge is processed next, see Front.
+
     Example:
 
     >>> triangulate_af([(0, 0), (1, 0), (0.5, 1)],[(0, 1), (1, 2), (2, 0)])
@@ -193,37 +326,414 @@ def triangulate_af(pts_list, bdy_edges):
     """
     # create empty list of elements
     elems = []
-    bdy_edges = bdy_edges[:]
+    front = Front(bdy_edges, pts_list, order=order)
     # main loop
-    while bdy_edges != []:
-        # take the last item from the list of bdy edges (and remove it)
-        a,b = bdy_edges.pop()
-        c = find_third_point(a, b, pts_list, bdy_edges)
+    while len(front) > 0:
+        # take the next edge from the front (and remove it)
+        a,b = front.pop()
+        c = find_third_point(a, b, pts_list, front)
         elems.append((a,b,c))
-        if is_boundary_edge(c, a, bdy_edges):
-            bdy_edges.remove((c,a))
-        else:
-            bdy_edges.append((a,c))
-        if is_boundary_edge(b, c, bdy_edges):
-            bdy_edges.remove((b,c))
+        front.close_or_add(c, a)
+        front.close_or_add(b, c)
+    return elems
+
+def _edge_box(e, pts_list):
+    ax, ay = pts_list[e[0]]
+    bx, by = pts_list[e[1]]
+    return min(ax, bx), min(ay, by), max(ax, bx), max(ay, by)
+
+def _grid_add_edge(edges_grid, e, pts_list):
+    xmin, ymin, xmax, ymax = _edge_box(e, pts_list)
+    edges_grid.insert(tuple(e), xmin, ymin, xmax, ymax)
+
+def _grid_remove_edge(edges_grid, e, pts_list):
+    xmin, ymin, xmax, ymax = _edge_box(e, pts_list)
+    edges_grid.remove(tuple(e), xmin, ymin, xmax, ymax)
+
+def edge_intersects_edges_grid(e1, nodes, edges_grid):
+    """
+    Returns True if edge "e1" intersects any edge stored in the BucketGrid
+    "edges_grid".
+
+    This is the same test as edge_intersects_edges(), only the edges whose
+    bounding boxes are far from "e1" are not tested at all.
+
+    Example:
+
+    >>> from spatial import BucketGrid
+    >>> nodes = [[0,0],[0,1],[1,1],[1,0],[0.5,0.5]]
+    >>> g = BucketGrid(0.5)
+    >>> for e in [(0,3),(3,2),(2,1),(1,0)]:
+    ...     _grid_add_edge(g, e, nodes)
+    >>> edge_intersects_edges_grid((0,2), nodes, g)
+    False
+    >>> _grid_add_edge(g, (1,3), nodes)
+    >>> edge_intersects_edges_grid((0,2), nodes, g)
+    True
+
+    """
+    eps = 1e-9*edges_grid.cell_size
+    xmin, ymin, xmax, ymax = _edge_box(e1, nodes)
+    for e2 in edges_grid.query(xmin-eps, ymin-eps, xmax+eps, ymax+eps):
+        if e1[1] == e2[0] or e1[0] == e2[1]:
+            continue
+        if two_edges_intersect(nodes, e1, e2):
+            return True
+    return False
+
+def _circumcircle(a, b, c, pts_list):
+    ax, ay = pts_list[a]
+    bx, by = pts_list[b]
+    cx, cy = pts_list[c]
+    bx = float(bx - ax); by = float(by - ay)
+    cx = float(cx - ax); cy = float(cy - ay)
+    d = 2*(bx*cy - by*cx)
+    b2 = bx*bx + by*by
+    c2 = cx*cx + cy*cy
+    ux = (cy*b2 - by*c2)/d
+    uy = (bx*c2 - cx*b2)/d
+    return ax + ux, ay + uy, sqrt(ux*ux + uy*uy)
+
+def find_third_point_grid(a, b, pts_list, pts_grid, edges_grid):
+    """
+    Same as find_third_point(), but the candidate points and the boundary
+    edges are taken from the BucketGrids "pts_grid" and "edges_grid".
+
+    The cells around the edge (a,b) are searched ring by ring until some
+    admissible point "c" is found. Every point that makes a larger angle
+    than "c" lies inside the circumcircle of (a,b,c), so only the cells
+    overlapping this circle need to be examined to find the optimal point.
+    The candidates are tested in the order of increasing criterion (and
+    index), so the result is exactly the same as from find_third_point().
+
+    Example:
+
+    >>> pts = [[0,0],[0,1],[1,1],[1,0],[0.5,0.5]]
+    >>> edges = [[0,1],[1,2],[2,3],[3,0]]
+    >>> pts_grid, edges_grid = _make_grids(pts, edges)
+    >>> find_third_point_grid(3, 2, pts, pts_grid, edges_grid)
+    4
+
+    """
+    def best_point(candidates):
+        crits = []
+        for c in candidates:
+            if c != a and c != b and is_on_the_left(c, a, b, pts_list):
+                crits.append((criterion(a, b, c, pts_list), c))
+        crits.sort()
+        for crit, c in crits:
+            if not (edge_intersects_edges_grid((a, c), pts_list, edges_grid) or
+                    edge_intersects_edges_grid((b, c), pts_list, edges_grid)):
+                return c
+        return None
+
+    xmin, ymin, xmax, ymax = _edge_box((a, b), pts_list)
+    i0, j0 = pts_grid.cell(xmin, ymin)
+    i1, j1 = pts_grid.cell(xmax, ymax)
+    i_min, j_min, i_max, j_max = pts_grid.cell_range
+    r = 0
+    while True:
+        c = best_point(pts_grid.query_ring(i0, j0, i1, j1, r))
+        if c is not None:
+            break
+        if i0-r <= i_min and j0-r <= j_min and i1+r >= i_max and j1+r >= j_max:
+            raise TriangulationError("ERROR: Optimal point not found in find_third_point().")
+        r += 1
+    ox, oy, radius = _circumcircle(a, b, c, pts_list)
+    radius += 1e-9*(radius + pts_grid.cell_size)
+    return best_point(pts_grid.query(ox - radius, oy - radius,
+        ox + radius, oy + radius))
+
+def _make_grids(pts_list, bdy_edges, cell_size=None):
+    if cell_size is None:
+        cell_size = grid_cell_size(pts_list)
+    pts_grid = BucketGrid(cell_size)
+    for i, (x, y) in enumerate(pts_list):
+        pts_grid.insert_point(i, x, y)
+    edges_grid = BucketGrid(pts_grid.cell_size)
+    for e in bdy_edges:
+        _grid_add_edge(edges_grid, e, pts_list)
+    return pts_grid, edges_grid
+
+def size_function(size):
+    """
+    Returns the target element size h(x, y) as a function.
+
+    The "size" can be a number (constant size), a function h(x, y) or a
+    spatial.BackgroundGrid.
+
+    Example:
+
+    >>> h = size_function(0.1)
+    >>> h(5, 7)
+    0.1
+    >>> h = size_function(lambda x, y: 0.1 + x)
+    >>> h(1, 0)
+    1.1
+
+    """
+    if callable(size):
+        return size
+    h = float(size)
+    if h <= 0:
+        raise ValueError("The element size must be positive.")
+    return lambda x, y: h
+
+def _ideal_point(a, b, pts_list, h):
+    """
+    Returns the point (x, y) to the left of the edge (a, b), which forms an
+    isosceles triangle with it with the sides of the length "d" close to
+    the target size h(x, y) in the middle of the edge, and the length "d".
+    """
+    ax, ay = pts_list[a]
+    bx, by = pts_list[b]
+    dx = float(bx - ax)
+    dy = float(by - ay)
+    length = sqrt(dx*dx + dy*dy)
+    mx = (ax + bx)/2.
+    my = (ay + by)/2.
+    # keep the triangle reasonably shaped even if the size changes abruptly
+    d = min(max(h(mx, my), 0.55*length), 2*length)
+    height = sqrt(d*d - length*length/4)
+    return mx - dy/length*height, my + dx/length*height, d
+
+def _point_in_triangle(p, a, b, c, pts_list):
+    return is_on_the_left(p, a, b, pts_list) and \
+            is_on_the_left(p, b, c, pts_list) and \
+            is_on_the_left(p, c, a, pts_list)
+
+def _split_points(ax, ay, bx, by, h):
+    """
+    Returns the list of the points splitting the segment from (ax, ay) to
+    (bx, by) into parts not longer than the target size h(x, y) (at their
+    ends and middle).
+    """
+    length = sqrt((bx - ax)**2 + (by - ay)**2)
+    h_min = min(h(ax, ay), h((ax + bx)/2., (ay + by)/2.), h(bx, by))
+    k = int(ceil(length/h_min - 1e-9))
+    if k <= 1:
+        return []
+    points = []
+    x0, y0 = ax, ay
+    for i in range(1, k+1):
+        x1 = ax + (bx - ax)*i/float(k)
+        y1 = ay + (by - ay)*i/float(k)
+        if i == k:
+            x1, y1 = bx, by
+        # the size can be smaller inside of the part
+        points.extend(_split_points(x0, y0, x1, y1, h))
+        if i < k:
+            points.append([x1, y1])
+        x0, y0 = x1, y1
+    return points
+
+def split_boundary(pts_list, bdy_edges, size, keep=()):
+    """
+    Splits the boundary edges longer than the target element size (see
+    size_function()) into equal parts, so that the advancing front starts
+    from a boundary spaced according to the size. The new points are
+    appended to "pts_list".
+
+    Returns the tuple (edges, origin): the list of the new boundary edges
+    and the index of the original edge of each of them (to carry over the
+    markers). The edges in "keep" (the pairs (a, b), e.g. the curved edges)
+    are not split.
+
+    Example:
+
+    >>> pts = [[0, 0], [1, 0], [0, 1]]
+    >>> split_boundary(pts, [(0, 1), (1, 2), (2, 0)], 0.5)
+    ([(0, 3), (3, 1), (1, 4), (4, 5), (5, 2), (2, 6), (6, 0)], [0, 0, 1, 1, 1, 2, 2])
+    >>> [[round(x, 3), round(y, 3)] for x, y in pts[3:]]
+    [[0.5, 0.0], [0.667, 0.333], [0.333, 0.667], [0.0, 0.5]]
+
+    """
+    h = size_function(size)
+    keep = set([(min(a, b), max(a, b)) for a, b in keep])
+    # the points of the edges split so far, so that an edge given in both
+    # directions is split only once
+    split = {}
+    edges = []
+    origin = []
+    for i, (a, b) in enumerate(bdy_edges):
+        key = (min(a, b), max(a, b))
+        if key in keep:
+            points = []
+        elif key in split:
+            points = split[key]
+            if key[0] != a:
+                points = points[::-1]
         else:
-            bdy_edges.append((c,b))
+            ax, ay = pts_list[a]
+            bx, by = pts_list[b]
+            points = []
+            for x, y in _split_points(ax, ay, bx, by, h):
+                points.append(len(pts_list))
+                pts_list.append([x, y])
+            split[key] = points if key[0] == a else points[::-1]
+        chain = [a] + points + [b]
+        for j in range(len(chain) - 1):
+            edges.append((chain[j], chain[j+1]))
+            origin.append(i)
+    return edges, origin
+
+def insert_ideal_point(a, b, pts_list, pts_grid, edges_grid, h):
+    """
+    Tries to add a new point to the left of the front edge (a, b), so that
+    the new triangle has about the target size h(x, y).
+
+    The point is rejected if some existing point is closer to it than 0.7
+    times the desired edge length (such a point should be used instead),
+    if the new edges would intersect the front, or if the new triangle
+    would contain a point. Otherwise the point is appended to "pts_list"
+    and to "pts_grid" and its index is returned, else None is returned.
+
+    Example:
+
+    >>> pts = [[0,0],[1,0],[1,1],[0,1]]
+    >>> edges = [(0,1),(1,2),(2,3),(3,0)]
+    >>> pts_grid, edges_grid = _make_grids(pts, edges)
+    >>> _grid_remove_edge(edges_grid, (0,1), pts)
+    >>> insert_ideal_point(0, 1, pts, pts_grid, edges_grid, size_function(1))
+    >>> insert_ideal_point(0, 1, pts, pts_grid, edges_grid, size_function(0.6))
+    4
+    >>> [round(v, 4) for v in pts[4]]
+    [0.5, 0.3317]
+
+    """
+    x, y, d = _ideal_point(a, b, pts_list, h)
+    r = 0.7*d
+    for c in pts_grid.query(x - r, y - r, x + r, y + r):
+        cx, cy = pts_list[c]
+        if (cx - x)**2 + (cy - y)**2 < r*r:
+            return None
+    p = len(pts_list)
+    pts_list.append([x, y])
+    ok = not (edge_intersects_edges_grid((a, p), pts_list, edges_grid) or
+            edge_intersects_edges_grid((b, p), pts_list, edges_grid))
+    if ok:
+        xmin, ymin, xmax, ymax = _edge_box((a, b), pts_list)
+        for c in pts_grid.query(min(xmin, x), min(ymin, y), max(xmax, x),
+                max(ymax, y)):
+            if c != a and c != b and _point_in_triangle(c, a, b, p, pts_list):
+                ok = False
+                break
+    if not ok:
+        pts_list.pop()
+        return None
+    pts_grid.insert_point(p, x, y)
+    return p
+
+def triangulate_af_grid(pts_list, bdy_edges, order="stack", size=None):
+    """
+    Create a triangulation using the advancing front method, with the points
+    and the front edges kept in a uniform grid.
+
+    Only the points and front edges close to the current front edge are
+    examined (see find_third_point_grid()), which makes this much faster than
+    triangulate_af() for larger domains, but the returned elements are
+    exactly the same.
+
+    If the target element size "size" is given (see size_function()), new
+    points are created inside the domain as the front advances (see
+    insert_ideal_point()) and appended to "pts_list", so that the elements
+    have about this size. The boundary points must be spaced according to
+    the size as well, split the boundary edges by split_boundary() first
+    (Domain.triangulate() does it); ValueError is raised for a boundary
+    edge longer than twice the size.
+
+    Example:
+
+    >>> triangulate_af_grid([(0, 0), (1, 0), (0.5, 1)],[(0, 1), (1, 2), (2, 0)])
+    [(2, 0, 1)]
+    >>> triangulate_af_grid([(0,0),(1,0),(1,1),(0,1),(0.5,0.5)],[(0,1),(1,2),(2,3),(3,0)])
+    [(3, 0, 4), (4, 0, 1), (4, 1, 2), (4, 2, 3)]
+    >>> pts = [[0,0],[1,0],[2,0],[2,1],[2,2],[1,2],[0,2],[0,1]]
+    >>> elems = triangulate_af_grid(pts, [(i, (i+1) % 8) for i in range(8)], size=1)
+    >>> len(pts), len(elems)
+    (9, 8)
+    >>> [round(v, 6) for v in pts[8]]
+    [1.0, 1.0]
+
+    """
+    elems = []
+    front = Front(bdy_edges, pts_list, order=order)
+    if size is None:
+        h = None
+        pts_grid, edges_grid = _make_grids(pts_list, front)
+    else:
+        h = size_function(size)
+        for a, b in bdy_edges:
+            ax, ay = pts_list[a]
+            bx, by = pts_list[b]
+            if (bx - ax)**2 + (by - ay)**2 > (2*h((ax + bx)/2.,
+                    (ay + by)/2.))**2:
+                raise ValueError("The boundary edge (%d, %d) is much longer than the element size, split it by split_boundary()." % (a, b))
+        sizes = sorted([h(x, y) for x, y in pts_list])
+        cell_size = min(grid_cell_size(pts_list), sizes[len(sizes)//2])
+        pts_grid, edges_grid = _make_grids(pts_list, front, cell_size)
+    while len(front) > 0:
+        a,b = front.pop()
+        _grid_remove_edge(edges_grid, (a,b), pts_list)
+        c = None
+        if h is not None:
+            c = insert_ideal_point(a, b, pts_list, pts_grid, edges_grid, h)
+        if c is None:
+            c = find_third_point_grid(a, b, pts_list, pts_grid, edges_grid)
+        elems.append((a,b,c))
+        for p, q in [(c, a), (b, c)]:
+            e = front.has_edge(p, q)
+            if e is None:
+                front.add(q, p)
+                _grid_add_edge(edges_grid, (q, p), pts_list)
+            else:
+                front.remove(*e)
+                _grid_remove_edge(edges_grid, e, pts_list)
     return elems
 
+def triangulate(pts_list, bdy_edges, method="af", order="stack", size=None):
+    """
+    Triangulates the domain given by the points "pts_list" and the
+    (oriented) boundary edges "bdy_edges", returns the list of elements.
+
+    method == "af" ....... advancing front, see triangulate_af()
+    method == "af_grid" .. advancing front accelerated by a uniform grid,
+                           see triangulate_af_grid()
+    method == "delaunay" . constrained Delaunay triangulation, see
+                           delaunay.triangulate_delaunay()
+
+    The "order" decides which front edge is processed next, see Front (it
+    is only used by the advancing front methods).
+
+    The target element "size" (see size_function()) is only supported by
+    the advancing front methods, the new points are appended to
+    "pts_list". As triangulate_af_grid() gives the same result as
+    triangulate_af(), it is used for both methods in this case.
+
+    Example:
+
+    >>> triangulate([(0,0),(1,0),(1,1),(0,1),(0.5,0.5)],[(0,1),(1,2),(2,3),(3,0)], method="af_grid")
+    [(3, 0, 4), (4, 0, 1), (4, 1, 2), (4, 2, 3)]
+
+    """
+    if size is not None and method not in ("af", "af_grid"):
+        raise ValueError("The element size is not supported by the method '%s'." % method)
+    if method == "af" and size is None:
+        return triangulate_af(pts_list, bdy_edges, order=order)
+    elif method in ("af", "af_grid"):
+        return triangulate_af_grid(pts_list, bdy_edges, order=order,
+                size=size)
+    elif method == "delaunay":
+        from delaunay import triangulate_delaunay
+        return triangulate_delaunay(pts_list, bdy_edges)
+    else:
+        raise ValueError("Unknown triangulation method '%s'." % method)
+
 # Plot triangular mesh
 def plot_tria_mesh(pts_list, tria_mesh, filename="a.png"):
-    clf()
-    label=""
-    for elem in tria_mesh:
-        a,b,c = elem
-        ax,ay = pts_list[a]
-        bx,by = pts_list[b]
-        cx,cy = pts_list[c]
-        x_array = array([ax,bx,cx,ax])
-        y_array = array([ay,by,cy,ay])
-        plot(x_array, y_array, "g-")
-    axis("equal")
-    savefig(filename)
+    # matplotlib is slow to import, so it is only loaded by plot_mesh()
+    from plot import plot_mesh
+    plot_mesh(pts_list, tria_mesh, filename=filename)
 
 def convert_graph(vertices, edges):
     pts_list = []
@@ -346,20 +856,22 @@ def check_regularity(edges):
     The parameters in the list are edges, for example, "[0,1]" is an
     edge.
 
+    The exception is a BoundaryError, its attribute "nodes" lists the nodes
+    with only one edge (or with more than two edges).
+
     """
+    degree = {}
     for a, b in edges:
-        counter_a = 0
-        counter_b = 0
-        for x, y in edges:
-            if a == x or a == y:
-                counter_a += 1
-            if b == x or b == y:
-                counter_b += 1
-        assert (counter_a > 0) and (counter_b > 0)
-        if (counter_a == 1) or (counter_b == 1):
-            raise Exception("Boundary is not closed.")
-        if (counter_a > 2) or (counter_b > 2):
-            raise Exception("More than two edges share a node.")
+        degree[a] = degree.get(a, 0) + 1
+        if b != a:
+            degree[b] = degree.get(b, 0) + 1
+    for a, b in edges:
+        if (degree[a] == 1) or (degree[b] == 1):
+            nodes = sorted([n for n in degree if degree[n] == 1])
+            raise BoundaryError("Boundary is not closed.", nodes)
+        if (degree[a] > 2) or (degree[b] > 2):
+            nodes = sorted([n for n in degree if degree[n] > 2])
+            raise BoundaryError("More than two edges share a node.", nodes)
 
 def find_loops(edges):
     """
@@ -385,42 +897,41 @@ def find_loops(edges):
 
     """
     check_regularity(edges)
+    # incident[n] ... indices of the edges at the node "n", in the order of
+    # "edges"
+    incident = {}
+    for i, (a, b) in enumerate(edges):
+        incident.setdefault(a, []).append(i)
+        if b != a:
+            incident.setdefault(b, []).append(i)
+    used = [False]*len(edges)
     loops = []
-    edges = edges[:]
-    start_i = -1
-    last_i = -1
-    n = []
-    while edges != []:
-        if start_i == -1:
-            e = edges[0]
-            n = [e]
-            del edges[0]
-            start_i = n[-1][0]
-            last_i = n[-1][1]
-        else:
-            ok = False
-            for i, e in enumerate(edges):
-                if e[0] == last_i:
-                    n.append(e)
-                    del edges[i]
-                    ok = True
+    first = 0
+    while True:
+        while first < len(edges) and used[first]:
+            first += 1
+        if first == len(edges):
+            break
+        used[first] = True
+        n = [edges[first]]
+        start_i = n[-1][0]
+        last_i = n[-1][1]
+        while True:
+            for i in incident[last_i]:
+                if not used[i]:
                     break
-                elif e[1] == last_i:
-                    n.append((e[1], e[0]))
-                    del edges[i]
-                    ok = True
-                    break
-            if not ok:
-                if start_i == last_i:
-                    start_i = -1
-                    loops.append(n)
-                else:
-                    raise Exception("Missing some boundary edge")
+            else:
+                break
+            used[i] = True
+            e = edges[i]
+            if e[0] == last_i:
+                n.append(e)
+            else:
+                n.append((e[1], e[0]))
             last_i = n[-1][1]
-    if start_i == last_i:
+        if start_i != last_i:
+            raise BoundaryError("Missing some boundary edge", [last_i])
         loops.append(n)
-    else:
-        raise Exception("Missing some boundary edge")
     return loops
 
 def orient_loops(nodes, loops):
@@ -491,7 +1002,7 @@ def two_edges_intersect(nodes, e1, e2):
     D = nodes[e2[1]]
     return intersect(A, B, C, D)
 
-def any_edges_intersect(nodes, edges):
+def any_edges_intersect(nodes, edges, return_pairs=False):
     """
     Returns True if ANY two edges intersect, otherwise Returns False.
 
@@ -499,22 +1010,67 @@ def any_edges_intersect(nodes, edges):
     the boundary edges are inputted into the paramter "edges".  For example,
     in the example below "[0,0]" is a node and "(0,3)" is a boundary edge.
 
+    If "return_pairs" is True, the list of all intersecting pairs of edges
+    (e1, e2) is returned instead (e1 comes before e2 in "edges").
+
+    Each edge is put into the cells of a uniform grid (with the cell size
+    equal to the median edge length) that the edge passes through (see
+    spatial.segment_cells()) and only the pairs of edges sharing a grid cell
+    are tested, so the cost is about linear in the total length of the edges
+    (in cells) plus the number of nearby pairs, even if a few edges are much
+    longer than the rest.
+
     Example:
 
     >>> any_edges_intersect([[0,0],[0,1],[1,1],[1,0],[0.25,0.25],[0.25,0.75],[0.75,0.5]],[(0,3),(0,1),(1,2),(2,3),(4,6),(4,5),(5,6)])
     False
     >>> any_edges_intersect([[0,0],[0,1],[1,1],[1,0]],[(0,1),(1,2),(2,0),(3,1)])
     True
+    >>> any_edges_intersect([[0,0],[0,1],[1,1],[1,0]],[(0,1),(1,2),(2,0),(3,1)], return_pairs=True)
+    [((2, 0), (3, 1))]
 
     """
-    for i in range(len(edges)):
-        for j in range(i+1, len(edges)):
-            e1 = edges[i]
+    pairs = []
+    if len(edges) < 2:
+        return pairs if return_pairs else False
+    lengths = []
+    for e in edges:
+        ax, ay = nodes[e[0]]
+        bx, by = nodes[e[1]]
+        lengths.append(sqrt((bx - ax)**2 + (by - ay)**2))
+    lengths.sort()
+    cell = lengths[len(lengths)//2]
+    if cell <= 0:
+        cell = max(lengths[-1], 1.)
+    eps = 1e-9*cell
+    cells = {}
+    edge_cells = []
+    for i, e in enumerate(edges):
+        ax, ay = nodes[e[0]]
+        bx, by = nodes[e[1]]
+        c = segment_cells(cell, ax, ay, bx, by, eps)
+        edge_cells.append(c)
+        for key in c:
+            bucket = cells.get(key)
+            if bucket is None:
+                cells[key] = [i]
+            else:
+                bucket.append(i)
+    for i, e1 in enumerate(edges):
+        candidates = set()
+        for key in edge_cells[i]:
+            candidates.update(cells[key])
+        candidates = sorted([j for j in candidates if j > i])
+        for j in candidates:
             e2 = edges[j]
             if e1[1] == e2[0] or e1[0] == e2[1]:
                 continue
             if two_edges_intersect(nodes, e1, e2):
-                return True
+                if not return_pairs:
+                    return True
+                pairs.append((e1, e2))
+    if return_pairs:
+        return pairs
     return False
 
 def edge_intersects_edges(e1, nodes, edges):
@@ -536,8 +1092,7 @@ def edge_intersects_edges(e1, nodes, edges):
     the "nodes" list, and "[0,3]" is an item in the "edges" list.
 
     """
-    for i in range(len(edges)):
-        e2 = edges[i]
+    for e2 in edges:
         if e1[1] == e2[0] or e1[0] == e2[1]:
             continue
         if two_edges_intersect(nodes, e1, e2):
@@ -551,54 +1106,19 @@ def print_triangulated_mesh_xml(nodes, boundaries):
     print_triangulated_mesh_xml(nodes, boundaries)
     """
 
-    node_list = []
-    edge_list = []
-
-    for n in nodes.split(','):
-        if(len(n)!=0):
-            xy = n.split(' ')
-            node_list.append((float(xy[0]),float(xy[1])))
-
-    for b in boundaries.split(','):
-        if(len(b)!=0):
-            xyz = b.split(' ')
-            edge_list.append([int(xyz[0]),int(xyz[1]),int(xyz[2]),int(xyz[3])])
+    node_list = [tuple([float(x) for x in n.split(' ')[:2]])
+            for n in nodes.split(',') if n]
+    edge_list = [[int(x) for x in b.split(' ')[:4]]
+            for b in boundaries.split(',') if b]
 
     from femhub import Domain
+    from mesh_xml import write_mesh_xml
 
     d = Domain(node_list, [(edge[0], edge[1]) for edge in edge_list])
     m = d.triangulate()
     m._boundaries = edge_list
 
-    xml = "<?xml version='1.0' encoding='UTF-8'?>"
-    xml += "<mesheditor>"
-
-    xml += "<vertices>"
-    for i,n in enumerate(m._nodes):
-        xml += "<vertex id='" + str(i) + "'>"
-        xml += "<x>" + str(n[0]) + "</x><y>" + str(n[1]) + "</y>"
-        xml += "</vertex>"
-    xml += "</vertices>"
-
-    xml += "<elements>"
-    for i,e in enumerate(m._elements):
-        xml += "<element id='" + str(i) + "'>"
-        for j, v in enumerate(e):
-            xml += "<v" + str(j + 1) + ">" + str(v) + "</v" + str(j + 1) + ">"
-        xml += "<material>0</material>"
-        xml += "</element>"
-    xml += "</elements>"
-
-    xml += "<boundaries>"
-    for i,b in enumerate(m._boundaries):
-        xml += "<boundary id='" + str(i) + "'>"
-        for j,v in enumerate(b):
-            if j<2:
-                xml += "<v" + str(j + 1) + ">" + str(v) + "</v" + str(j + 1) + ">"
-        xml += "<marker>" + str(b[2]) + "</marker>"
-        xml += "<angle>" + str(b[3]) + "</angle>"
-        xml += "</boundary>"
-    xml += "</boundaries>"
-
-    xml += "</mesheditor>"
-    print xml
+    # str() keeps the output of the original XML writer
+    write_mesh_xml(sys.stdout, m._nodes, m._elements, m._boundaries,
+            float_format=str)
+    print